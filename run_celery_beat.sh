@@ -0,0 +1,2 @@
+#!/usr/bin/env bash
+celery -A wherethefuck beat -l info
\ No newline at end of file
@@ -10,5 +10,21 @@ app = Celery(broker=settings.CELERY_BROKER_URL)
 app.config_from_object('django.conf:settings')
 app.autodiscover_tasks(settings.INSTALLED_APPS)
 
+# periodic tasks (run them with run_celery_beat.sh).
+app.conf.beat_schedule = {
+    'purge-expired-auth-tokens': {
+        'task': 'wtfapi.tasks.purge_expired_auth_tokens',
+        'schedule': settings.AUTH_TOKEN_PURGE_INTERVAL,
+    },
+    'flush-mail-outbox': {
+        'task': 'wtfapi.tasks.flush_mail_outbox',
+        'schedule': settings.MAIL_OUTBOX_FLUSH_INTERVAL,
+    },
+    'archive-deleted-records': {
+        'task': 'wtfapi.tasks.archive_deleted_records',
+        'schedule': settings.ARCHIVE_INTERVAL,
+    },
+}
+
 if __name__ == '__main__':
     app.start()
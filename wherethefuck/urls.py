@@ -14,8 +14,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, include
+from wtfapi.api.pois.views import POITileAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('wtfapi.api.urls')),
+    path('tiles/pois/<int:z>/<int:x>/<int:y>.mvt', POITileAPIView.as_view(), name='poi-tile'),
 ]
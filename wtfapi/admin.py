@@ -1,10 +1,140 @@
+import json
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.gis.db.models import PointField, MultiPolygonField
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, Prefetch
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
+from category.models import Category
 from .models import POI, User, Country, Province
 
 
+def get_allowed_regions(request):
+    """
+    Resolves the ids of the countries and provinces the current user may manage. They are kept
+      in the request, so its changelist (and its filters) use plain id lists instead of re-running
+      the nested subqueries for each of them. They are not kept any longer: both queries are cheap
+      (indexed by manager), and any change to the managers or permissions applies right away.
+    :param request: The current (admin) request.
+    :return: A (country ids, province ids) tuple of lists.
+    """
+
+    allowed = getattr(request, '_allowed_regions', None)
+    if allowed is None:
+        countries = list(Country.objects.allowed_for(request.user).values_list('id', flat=True))
+        provinces = list(Province.objects.filter(Q(managers=request.user) | Q(country_id__in=countries))
+                         .values_list('id', flat=True))
+        allowed = request._allowed_regions = countries, provinces
+    return allowed
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginates without counting every row of large result sets. The planner estimate is used
+      instead (the table statistics in pg_class, for unfiltered changelists, or the EXPLAIN row
+      estimate otherwise), and the rows are only counted when that estimate is below
+      ADMIN_EXACT_COUNT_THRESHOLD.
+    """
+
+    @staticmethod
+    def _is_unfiltered(queryset):
+        # Changelists start from every row (see `SoftDeletedAdmin`), so any condition is a filter
+        # (a list filter, a search, or the scoping of non-superusers).
+        return not queryset.query.where.children
+
+    def _estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        with connection.cursor() as cursor:
+            if self._is_unfiltered(queryset):
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+                # Tables never analyzed (nor vacuumed) yet have no estimate: -1, or 0 before PostgreSQL 14.
+                return max(0, int(row[0])) if row else 0
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        estimate = self._estimate()
+        if estimate < settings.ADMIN_EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class RegionListFilter(admin.SimpleListFilter):
+    """
+    Filters POIs by region, through the indexed POI/region membership table. Non-superusers
+      are only offered the regions they manage.
+    """
+
+    model = None
+
+    def regions(self, request):
+        queryset = self.model.objects.all()
+        if not request.user.is_superuser:
+            countries, provinces = get_allowed_regions(request)
+            queryset = queryset.filter(id__in=countries if self.model is Country else provinces)
+        return queryset
+
+    def lookups(self, request, model_admin):
+        return list(self.regions(request).order_by('name').values_list('id', 'name'))
+
+    def queryset(self, request, queryset):
+        if self.value():
+            through = self.model.pois.through
+            column = self.model._meta.model_name + '_id'
+            return queryset.filter(id__in=through.objects.filter(**{column: self.value()}).values('poi_id'))
+        return queryset
+
+
+class CountryListFilter(RegionListFilter):
+    title = _('Country')
+    parameter_name = 'country'
+    model = Country
+
+
+class ProvinceListFilter(RegionListFilter):
+    title = _('Province')
+    parameter_name = 'province'
+    model = Province
+
+    def regions(self, request):
+        # Provinces are only offered once a country is chosen: there may be too many of them.
+        country = request.GET.get(CountryListFilter.parameter_name)
+        if not country:
+            return self.model.objects.none()
+        return super().regions(request).filter(country_id=country)
+
+
+class CategoryListFilter(admin.SimpleListFilter):
+    """
+    Filters POIs by category (subcategories included), with an IN list over the indexed
+      POI/category link table.
+    """
+
+    title = _('Category')
+    parameter_name = 'category'
+
+    def lookups(self, request, model_admin):
+        return list(Category.objects.order_by('title').values_list('id', 'title'))
+
+    def queryset(self, request, queryset):
+        try:
+            category = int(self.value() or '')
+        except ValueError:
+            return queryset
+        return queryset.in_categories([category])
+
+
 class UserAdmin(BaseUserAdmin):
 
     fieldsets = (
@@ -26,12 +156,71 @@ class UserAdmin(BaseUserAdmin):
     search_fields = ('username', 'email')
 
 
-class POIAdmin(admin.ModelAdmin):
-    pass
+class SoftDeletedAdmin(admin.ModelAdmin):
+    """
+    Lists the soft-deleted records too (which the default manager hides), so staff can still
+      review them.
+    """
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.all()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+class POIAdmin(SoftDeletedAdmin):
+    """
+    Non-superusers only see the POIs lying in the regions they manage (deleted POIs lie in no
+      region, so only superusers see them).
+
+    The changelist is meant for millions of POIs: the result count is estimated (see
+      `EstimatedCountPaginator`), the total count is never computed, the categories of each
+      page are prefetched at once, the name search is backed by a trigram index on UPPER(name),
+      and the filters are semi-joins over indexed link tables.
+    """
+
+    list_display = ('name', 'category_titles', 'rating_count', 'created_on')
+    list_filter = (CountryListFilter, ProvinceListFilter, CategoryListFilter)
+    list_select_related = ()
+    search_fields = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def category_titles(self, obj):
+        return ', '.join(category.title for category in obj.categories.all())
+    category_titles.short_description = _('Categories')
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'title'))
+        )
+        if request.user.is_superuser:
+            return queryset
+        countries, provinces = get_allowed_regions(request)
+        return queryset.allowed_for(request.user, countries, provinces)
+
+
+class RegionAdmin(SoftDeletedAdmin):
+    """
+    Non-superusers only see the countries and provinces they manage (provinces included, for
+      country managers), and may only put provinces in the countries they manage.
+    """
+
+    search_fields = ('name',)
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        countries, provinces = get_allowed_regions(request)
+        return queryset.filter(id__in=countries if self.model is Country else provinces)
 
-class RegionAdmin(admin.ModelAdmin):
-    pass
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'country' and not request.user.is_superuser:
+            kwargs['queryset'] = Country.objects.filter(id__in=get_allowed_regions(request)[0])
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 admin.site.register(User, UserAdmin)
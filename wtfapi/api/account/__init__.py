@@ -18,4 +18,7 @@ Their functions are like:
     - Bookmark place {uuid} (it will add the bookmark to the end).
     - Unbookmark place {uuid}.
     - Move bookmark {uuid} to the end or, if specified {uuid_other}, before {uuid_other}.
+    - Reorder bookmarks as {uuid list}.
+    - Rate / unrate many places, as a list of {uuid} with {score}.
+    - Bookmark / unbookmark many places, as a list of {uuid} with {bookmarked}.
 """
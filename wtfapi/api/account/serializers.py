@@ -1,10 +1,13 @@
 from django.utils.translation import ugettext_lazy as _
-from rest_framework.serializers import Serializer, CharField, EmailField, RelatedField, IntegerField, ValidationError
+from rest_framework.serializers import Serializer, CharField, EmailField, RelatedField, IntegerField, ListField, \
+    BooleanField, ValidationError
 from .transient import *
 from ...models import POI
 
 
 InvalidFlow = Exception("Invalid flow - please review internal usage of this serializer")
+# Maximum number of items accepted by the batch endpoints.
+MAX_BATCH_SIZE = 500
 
 
 class CreateOnlySerializer(Serializer):
@@ -33,6 +36,7 @@ class RegisterSerializer(CreateOnlySerializer):
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirmation']:
             raise ValidationError(_("Passwords don't match"))
+        return attrs
 
     def create(self, validated_data):
         return RegisterAction(validated_data['username'], validated_data['email'], validated_data['password'],
@@ -44,13 +48,15 @@ class LoginSerializer(CreateOnlySerializer):
     Serializer for log-in. Involves:
       username
       password
+      device (optional)
     """
 
     username = CharField(required=True)
     password = CharField(required=True)
+    device = CharField(required=False, default='', allow_blank=True, max_length=80)
 
     def create(self, validated_data):
-        return LoginAction(validated_data['username'], validated_data['password'])
+        return LoginAction(validated_data['username'], validated_data['password'], validated_data['device'])
 
 
 class ChangePasswordSerializer(CreateOnlySerializer):
@@ -70,6 +76,7 @@ class ChangePasswordSerializer(CreateOnlySerializer):
             raise ValidationError(_("New password must be different"))
         if attrs['new_password'] != attrs['new_password_confirmation']:
             raise ValidationError(_("Passwords don't match"))
+        return attrs
 
     def create(self, validated_data):
         return ChangePasswordAction(validated_data['current_password'], validated_data['new_password'],
@@ -86,7 +93,7 @@ class RequestPasswordResetSerializer(CreateOnlySerializer):
     username = CharField(required=True)
 
     def create(self, validated_data):
-        return RequestPasswordResetAction(self.username)
+        return RequestPasswordResetAction(validated_data['username'])
 
 
 class ResetPasswordSerializer(CreateOnlySerializer):
@@ -104,6 +111,7 @@ class ResetPasswordSerializer(CreateOnlySerializer):
     def validate(self, attrs):
         if attrs['new_password'] != attrs['new_password_confirmation']:
             raise ValidationError(_("Passwords don't match"))
+        return attrs
 
     def create(self, validated_data):
         return ResetPasswordAction(validated_data['recovery_key'], validated_data['new_password'],
@@ -189,4 +197,72 @@ class MovePOIBookmarkSerializer(CreateOnlySerializer):
         return MovePOIBookmarkAction(validated_data['poi'], validated_data['before'])
 
 
+class BatchRatePOIItemSerializer(Serializer):
+    """
+    Serializer for each item of a POI batch rate. Involves:
+      poi
+      score (null to remove the rating)
+    """
+
+    poi = IntegerField(required=True)
+    score = IntegerField(min_value=0, max_value=10, allow_null=True, required=True)
+
+
+class BatchRatePOISerializer(CreateOnlySerializer):
+    """
+    Serializer for POI batch rate. Involves:
+      actions (a list of poi & score)
+    """
+
+    actions = BatchRatePOIItemSerializer(many=True)
+
+    def validate_actions(self, value):
+        if len(value) > MAX_BATCH_SIZE:
+            raise ValidationError(_("Too many actions"))
+        return value
+
+    def create(self, validated_data):
+        return BatchRatePOIsAction([(item['poi'], item['score']) for item in validated_data['actions']])
+
+
+class BatchBookmarkPOIItemSerializer(Serializer):
+    """
+    Serializer for each item of a POI batch bookmark. Involves:
+      poi
+      bookmarked (false to remove the bookmark)
+    """
+
+    poi = IntegerField(required=True)
+    bookmarked = BooleanField(required=True)
+
+
+class BatchBookmarkPOISerializer(CreateOnlySerializer):
+    """
+    Serializer for POI batch bookmark. Involves:
+      actions (a list of poi & bookmarked)
+    """
+
+    actions = BatchBookmarkPOIItemSerializer(many=True)
+
+    def validate_actions(self, value):
+        if len(value) > MAX_BATCH_SIZE:
+            raise ValidationError(_("Too many actions"))
+        return value
+
+    def create(self, validated_data):
+        return BatchBookmarkPOIsAction([(item['poi'], item['bookmarked']) for item in validated_data['actions']])
+
+
+class ReorderPOIBookmarksSerializer(CreateOnlySerializer):
+    """
+    Serializer for POI bookmarks reordering. Involves:
+      pois (the bookmarked POI ids, in their new order)
+    """
+
+    pois = ListField(child=IntegerField(), required=True)
+
+    def create(self, validated_data):
+        return ReorderPOIBookmarksAction(validated_data['pois'])
+
+
 # Two endpoints will not have actions: logout, get profile.
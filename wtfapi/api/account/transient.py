@@ -15,9 +15,10 @@ class LoginAction:
     Action parsed from the login endpoint.
     """
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, device=''):
         self.username = username
         self.password = password
+        self.device = device
 
 
 class ChangePasswordAction:
@@ -105,6 +106,33 @@ class MovePOIBookmarkAction:
         self.before = before
 
 
+class BatchRatePOIsAction:
+    """
+    Action parsed from the POI batch rate endpoint.
+    """
+
+    def __init__(self, scores):
+        self.scores = scores
+
+
+class BatchBookmarkPOIsAction:
+    """
+    Action parsed from the POI batch bookmark endpoint.
+    """
+
+    def __init__(self, changes):
+        self.changes = changes
+
+
+class ReorderPOIBookmarksAction:
+    """
+    Action parsed from the POI bookmarks reorder endpoint.
+    """
+
+    def __init__(self, pois):
+        self.pois = pois
+
+
 class UnbookmarkPOIAction:
     """
     Action parsed from the POI unbookmark endpoint.
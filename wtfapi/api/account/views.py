@@ -1,15 +1,20 @@
-from django.contrib.auth import authenticate
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.translation import ugettext as _
 from rest_framework import status
 from rest_framework.serializers import as_serializer_error, DjangoValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
+from ..authentication import issue_token
 from ..base_views import AuthenticatedAPIView, LoginRequiredAPIView
+from ..passwords import authenticate_credentials, set_password
+from ..throttling import EarlyThrottledAPIViewMixin
 from .serializers import *
 from ...models import User
 
 
-class RegisterAPIView(APIView):
+class RegisterAPIView(EarlyThrottledAPIViewMixin, APIView):
     """
     This is the registration endpoint. It is expected a post call with parameters
       being username, email, password and password_confirmation.
@@ -26,6 +31,7 @@ class RegisterAPIView(APIView):
         action = serializer.save()
         try:
             user = User(username=action.username, email=action.email)
+            set_password(user, action.password)
             user.full_clean()
             user.save()
             data = {
@@ -37,25 +43,26 @@ class RegisterAPIView(APIView):
             raise ValidationError(detail=as_serializer_error(exc))
 
 
-class LoginAPIView(APIView):
+class LoginAPIView(EarlyThrottledAPIViewMixin, APIView):
     """
-    This is the login endpoint. It is expected a post call with parameters being username
-      and password.
+    This is the login endpoint. It is expected a post call with parameters being username,
+      password and, optionally, a device name.
     """
 
     def post(self, request):
         """
         De-serializes and validates the login data. A user will be matched, or perhaps not.
-          Upon success, a token will be created for the logged-in user, and returned in
-          an "Authorization" header.
+          Upon success, a new (expiring) token will be created for the logged-in user, and
+          returned in an "Authorization" header. Each user may keep up to AUTH_TOKEN_MAX_PER_USER
+          tokens (e.g. one per device): logging in beyond that evicts the oldest ones.
         """
 
-        serializer = RegisterSerializer(data=request.POST)
+        serializer = LoginSerializer(data=request.POST)
         serializer.is_valid(True)
         action = serializer.save()
-        user = authenticate(request, username=action.username, password=action.password)
+        user = authenticate_credentials(request, action.username, action.password)
         if user:
-            key = Token.objects.create(user=user).key
+            key = issue_token(user, action.device)
             return Response({'detail': 'success'}, status=status.HTTP_200_OK, headers={
                 'Authorization': 'Token ' + key
             })
@@ -70,12 +77,61 @@ class Logout(AuthenticatedAPIView):
 
     def post(self, request):
         if request.auth:
-            # It will be a token. Let's delete it.
+            # It will be a token. Let's delete it (this also drops it from the cache).
             request.auth.delete()
         return Response({'detail': 'success'}, status=status.HTTP_200_OK)
 
 
-class CloseAccount(LoginRequiredAPIView):
+class RequestPasswordReset(EarlyThrottledAPIViewMixin, APIView):
+    """
+    This is the password reset request view. It is expected a post call with the username
+      parameter. The user (if any) will be e-mailed a recovery key, at most once per
+      MAIL_OUTBOX_DEDUP_WINDOW seconds.
+    """
+
+    def post(self, request):
+        serializer = RequestPasswordResetSerializer(data=request.POST)
+        serializer.is_valid(True)
+        action = serializer.save()
+        user = User.objects.filter(username=action.username, is_active=True).exclude(email='').first()
+        if user:
+            # The recovery key is made of the same parts Django's password reset links have.
+            key = '%s.%s' % (urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user))
+            user.email_user(_('Password reset'), _('Use this key to reset your password: %s') % key,
+                            dedup_key='password-reset:%d' % user.pk)
+        # The response is the same whether the user exists or not.
+        return Response({'detail': 'success'}, status=status.HTTP_200_OK)
+
+
+class ResetPassword(EarlyThrottledAPIViewMixin, APIView):
+    """
+    This is the password reset view. It is expected a post call with parameters being recovery_key,
+      new_password and new_password_confirmation. All the tokens of the user are destroyed.
+    """
+
+    def _get_user(self, recovery_key):
+        uidb64, separator, token = recovery_key.partition('.')
+        try:
+            user = User.objects.get(pk=force_text(urlsafe_base64_decode(uidb64)), is_active=True)
+        except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+            return None
+        return user if default_token_generator.check_token(user, token) else None
+
+    def post(self, request):
+        serializer = ResetPasswordSerializer(data=request.POST)
+        serializer.is_valid(True)
+        action = serializer.save()
+        user = self._get_user(action.recovery_key)
+        if user:
+            set_password(user, action.new_password)
+            user.save()
+            user.auth_tokens.all().delete()
+            return Response({'detail': 'success'}, status=status.HTTP_200_OK)
+        else:
+            return Response({'detail': 'failed'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+class CloseAccount(EarlyThrottledAPIViewMixin, LoginRequiredAPIView):
     """
     This is the close account view. It will inactivate the user, and destroy authentication.
     """
@@ -85,10 +141,9 @@ class CloseAccount(LoginRequiredAPIView):
         serializer.is_valid(True)
         action = serializer.save()
         # The user will re-authenticate just to check credentials validity.
-        user = authenticate(request, username=action.username, password=action.password)
+        user = authenticate_credentials(request, action.username, action.password)
         if user:
-            if request.auth:
-                request.auth.delete()
+            user.auth_tokens.all().delete()
             user.is_active = False
             user.save()
             return Response({'detail': 'success'}, status=status.HTTP_200_OK)
@@ -96,7 +151,7 @@ class CloseAccount(LoginRequiredAPIView):
             return Response({'detail': 'failed'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
 
-class ChangePassword(LoginRequiredAPIView):
+class ChangePassword(EarlyThrottledAPIViewMixin, LoginRequiredAPIView):
     """
     This is the password change view.
     """
@@ -106,10 +161,57 @@ class ChangePassword(LoginRequiredAPIView):
         serializer.is_valid(True)
         action = serializer.save()
         # The user will re-authenticate just to check credentials validity.
-        user = authenticate(request, username=request.user.username, password=action.current_password)
+        user = authenticate_credentials(request, request.user.username, action.current_password)
         if user:
-            user.set_password(action.new_password)
+            set_password(user, action.new_password)
             user.save()
             return Response({'detail': 'success'}, status=status.HTTP_200_OK)
         else:
             return Response({'detail': 'failed'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+class BatchRatePOIs(LoginRequiredAPIView):
+    """
+    This is the batch rate view. It applies a list of rate/unrate actions (e.g. the ones
+      queued by an offline client) in a single transaction, and tells the result of each one.
+    """
+
+    def post(self, request):
+        serializer = BatchRatePOISerializer(data=request.data)
+        serializer.is_valid(True)
+        action = serializer.save()
+        results = request.user.rate_many(action.scores)
+        return Response({'results': [{'poi': poi, 'result': result}
+                                     for (poi, score), result in zip(action.scores, results)]},
+                        status=status.HTTP_200_OK)
+
+
+class BatchBookmarkPOIs(LoginRequiredAPIView):
+    """
+    This is the batch bookmark view. It applies a list of bookmark/unbookmark actions (e.g.
+      the ones queued by an offline client) in a single transaction, and tells the result of
+      each one.
+    """
+
+    def post(self, request):
+        serializer = BatchBookmarkPOISerializer(data=request.data)
+        serializer.is_valid(True)
+        action = serializer.save()
+        results = request.user.bookmark_many(action.changes)
+        return Response({'results': [{'poi': poi, 'result': result}
+                                     for (poi, bookmarked), result in zip(action.changes, results)]},
+                        status=status.HTTP_200_OK)
+
+
+class ReorderBookmarks(LoginRequiredAPIView):
+    """
+    This is the bookmarks reorder view. It applies a whole client-side reordering of the
+      user's bookmarks in a single transaction.
+    """
+
+    def post(self, request):
+        serializer = ReorderPOIBookmarksSerializer(data=request.data)
+        serializer.is_valid(True)
+        action = serializer.save()
+        request.user.bookmark_reorder(action.pois)
+        return Response({'detail': 'success'}, status=status.HTTP_200_OK)
@@ -0,0 +1,124 @@
+"""
+Token authentication against the hashed, expiring `AuthToken` model, with caching. Resolved
+  tokens are kept for a few seconds in the local process and, optionally, for longer in a shared
+  cache (see the TOKEN_AUTH_* settings), so most API calls do not query the tokens table at all.
+
+Deleting a token, or saving its user (e.g. deactivating it), invalidates the cached entries (see
+  `wtfapi.signals`). Views changing what a user may do otherwise must invalidate them with
+  `invalidate_token` or `invalidate_user_tokens`. Since entries cached in other processes' memory
+  cannot be reached, those expire on their own after TOKEN_AUTH_LOCAL_TIMEOUT seconds. Cached
+  entries are keyed by the token digest, and their expiration is checked on every use.
+
+Cached users are loaded without their password hash, so it never reaches the shared cache. It is
+  loaded (by a query) when accessed, and it is not overwritten when they are saved.
+"""
+
+
+import time
+from copy import copy
+from threading import Lock
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from ..models import AuthToken
+from ..models.tokens import hash_token_key
+
+
+_local_entries = {}
+_local_lock = Lock()
+
+
+def _shared_cache():
+    return caches[settings.TOKEN_AUTH_CACHE] if settings.TOKEN_AUTH_CACHE else None
+
+
+def _cache_key(digest):
+    return 'token-auth:' + digest
+
+
+def _store_locally(digest, entry):
+    now = time.monotonic()
+    with _local_lock:
+        if len(_local_entries) >= settings.TOKEN_AUTH_LOCAL_MAX_ENTRIES:
+            for stale in [k for k, (expires_on, _) in _local_entries.items() if expires_on <= now]:
+                del _local_entries[stale]
+            if len(_local_entries) >= settings.TOKEN_AUTH_LOCAL_MAX_ENTRIES:
+                _local_entries.clear()
+        _local_entries[digest] = (now + settings.TOKEN_AUTH_LOCAL_TIMEOUT, entry)
+
+
+def invalidate_token(digest):
+    """
+    Drops the cached entry of a token.
+    :param digest: The token digest (i.e. `AuthToken.digest`).
+    """
+
+    with _local_lock:
+        _local_entries.pop(digest, None)
+    cache = _shared_cache()
+    if cache:
+        cache.delete(_cache_key(digest))
+
+
+def invalidate_user_tokens(user):
+    """
+    Drops the cached entries of all the tokens of a user.
+    :param user: The user.
+    """
+
+    for digest in AuthToken.objects.filter(user=user).values_list('digest', flat=True):
+        invalidate_token(digest)
+
+
+def issue_token(user, device=''):
+    """
+    Creates a new token for a user, evicting the oldest ones beyond AUTH_TOKEN_MAX_PER_USER.
+    :param user: The user to create the token for.
+    :param device: An optional name of the device (or client) using the token.
+    :return: The raw token key, to be given to the client.
+    """
+
+    token, key = AuthToken.objects.issue(user, device)
+    AuthToken.objects.evict_surplus(user, settings.AUTH_TOKEN_MAX_PER_USER)
+    return key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication, caching the resolved (user, token) pairs.
+    """
+
+    model = AuthToken
+
+    def _lookup(self, digest):
+        try:
+            token = self.model.objects.select_related('user').defer('user__password').get(digest=digest)
+        except self.model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        return token.user, token
+
+    def _resolve(self, digest):
+        entry = _local_entries.get(digest)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        cache = _shared_cache()
+        resolved = cache.get(_cache_key(digest)) if cache else None
+        if resolved is None:
+            resolved = self._lookup(digest)
+            if cache:
+                cache.set(_cache_key(digest), resolved, settings.TOKEN_AUTH_CACHE_TIMEOUT)
+        _store_locally(digest, resolved)
+        return resolved
+
+    def authenticate_credentials(self, key):
+        user, token = self._resolve(hash_token_key(key))
+        if token.expires_on <= timezone.now():
+            raise AuthenticationFailed(_('Token expired.'))
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        # Each request gets its own copy, since cached entries are shared among threads.
+        return copy(user), token
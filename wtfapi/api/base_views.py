@@ -1,6 +1,6 @@
 from rest_framework.views import APIView
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from .authentication import CachedTokenAuthentication
 
 
 class AuthenticatedAPIView(APIView):
@@ -8,7 +8,7 @@ class AuthenticatedAPIView(APIView):
     This view authenticates via either token or session.
     """
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
 
 
 class LoginRequiredAPIView(AuthenticatedAPIView):
@@ -0,0 +1,43 @@
+"""
+Opaque cursors for keyset-paginated endpoints. A cursor is the key of the last item of a page,
+  signed (so clients cannot forge arbitrary keys) and tied to the endpoint it was issued by.
+"""
+
+
+from django.core import signing
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.serializers import CharField, ValidationError
+
+
+def _salt(scope):
+    return 'wtfapi.cursor.' + scope
+
+
+def encode_cursor(key, scope):
+    """
+    Makes a cursor from a key.
+    :param key: The key (a tuple of JSON-serializable values) of the last item of a page.
+    :param scope: The name of the endpoint the cursor is issued by.
+    :return: The cursor token.
+    """
+
+    return signing.dumps(list(key), salt=_salt(scope), compress=True)
+
+
+class CursorField(CharField):
+    """
+    A cursor parameter. It is decoded back to the key it was made from.
+    """
+
+    def __init__(self, scope, **kwargs):
+        self.scope = scope
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            key = signing.loads(super().to_internal_value(data), salt=_salt(self.scope))
+        except signing.BadSignature:
+            raise ValidationError(_('Invalid cursor'))
+        if not isinstance(key, list):
+            raise ValidationError(_('Invalid cursor'))
+        return tuple(key)
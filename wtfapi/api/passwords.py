@@ -0,0 +1,130 @@
+"""
+Password hashing, optionally offloaded to a bounded pool of worker processes (see the
+  PASSWORD_HASHING_* settings). Hashing is CPU-bound by design, so a burst of logins would
+  otherwise keep every request worker busy, starving the regular (e.g. POI) traffic.
+
+When the pool is enabled, at most PASSWORD_HASHING_MAX_PENDING hashing jobs may be queued or
+  running at once: beyond that, requests fail fast with a 503 response instead of piling up.
+  A job keeps its slot until it actually finishes, even if the request stopped waiting for it.
+
+Credentials are still checked by `django.contrib.auth.authenticate`, so every configured backend
+  (and the `user_login_failed` signal) keeps working: `PooledModelBackend` is the model backend
+  hashing through the pool.
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from threading import BoundedSemaphore, Lock
+import django
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many authentication requests. Try again later.')
+    default_code = 'password_hashing_busy'
+
+
+_pool = None
+_pending = None
+_pool_lock = Lock()
+
+
+def _get_pool():
+    global _pool, _pending
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pending = BoundedSemaphore(settings.PASSWORD_HASHING_MAX_PENDING)
+                _pool = ProcessPoolExecutor(settings.PASSWORD_HASHING_POOL_SIZE, initializer=django.setup)
+    return _pool
+
+
+def _run(function, *args):
+    if not settings.PASSWORD_HASHING_POOL_SIZE:
+        return function(*args)
+
+    pool = _get_pool()
+    if not _pending.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        future = pool.submit(function, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    # The slot is released when the job is done, not when we stop waiting for it: timed out
+    # jobs are still queued (or running) in the pool, and must count towards the bound.
+    future.add_done_callback(lambda _future: _pending.release())
+    try:
+        return future.result(settings.PASSWORD_HASHING_TIMEOUT)
+    except TimeoutError:
+        raise PasswordHashingBusy()
+
+
+def make_password(password):
+    """
+    Hashes a password, with the preferred hasher.
+    :return: The encoded password.
+    """
+
+    return _run(hashers.make_password, password)
+
+
+def check_password(password, encoded):
+    """
+    Tells whether a raw password matches an encoded one.
+    """
+
+    return _run(hashers.check_password, password, encoded)
+
+
+def set_password(user, password):
+    """
+    Like `user.set_password`, but hashing through the pool. The user is not saved.
+    """
+
+    user.password = make_password(password)
+    user._password = password
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    The model backend, but hashing through the pool. Passwords stored with an outdated hasher
+      are upgraded, as the model backend does.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long as wrong passwords.
+            make_password(password)
+            return None
+        if not check_password(password, user.password) or not self.user_can_authenticate(user):
+            return None
+
+        preferred = hashers.get_hasher()
+        if hashers.identify_hasher(user.password).algorithm != preferred.algorithm or \
+                preferred.must_update(user.password):
+            user.password = make_password(password)
+            user.save(update_fields=['password'])
+        return user
+
+
+def authenticate_credentials(request, username, password):
+    """
+    Authenticates a user by the configured backends (see `PooledModelBackend`).
+    :return: The authenticated user, or None.
+    """
+
+    return authenticate(request, username=username, password=password)
@@ -0,0 +1,10 @@
+"""
+POIs: This clump of functions exposes the POI features for the API.
+
+Their functions are like:
+  - Export POIs, optionally within {distance} of {latitude} {longitude}, in {countries} or
+    {provinces}, and/or in {categories} (or their subcategories), as GeoJSON or NDJSON.
+  - Search POIs with the same filters, nearest first, in keyset-paginated pages.
+  - List the POIs within {distance} of {latitude} {longitude}, nearest first, in keyset-paginated
+    pages.
+"""
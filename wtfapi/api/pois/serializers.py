@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.serializers import FloatField, IntegerField, ListField, ChoiceField, CharField, ValidationError
+from ..account.serializers import CreateOnlySerializer
+from ..cursors import CursorField
+from .transient import *
+from ...exports import WRITERS
+from ...models import Country, Province
+from ...models.poi import count_cluster_cells
+
+
+# Maximum page size of the paginated endpoints.
+MAX_PAGE_SIZE = 200
+
+
+class POIFilterSerializer(CreateOnlySerializer):
+    """
+    Base serializer for POI filters. Involves:
+      latitude, longitude and distance (all of them, or none)
+      countries
+      provinces
+      categories
+    """
+
+    latitude = FloatField(min_value=-90, max_value=90, required=False)
+    longitude = FloatField(min_value=-180, max_value=180, required=False)
+    distance = FloatField(min_value=0, required=False)
+    countries = ListField(child=IntegerField(), required=False)
+    provinces = ListField(child=IntegerField(), required=False)
+    categories = ListField(child=IntegerField(), required=False)
+
+    def validate(self, attrs):
+        given = [key in attrs for key in ('latitude', 'longitude', 'distance')]
+        if any(given) and not all(given):
+            raise ValidationError(_("Latitude, longitude and distance must be given together"))
+        return attrs
+
+    def _filter_data(self, validated_data):
+        point = None
+        if 'latitude' in validated_data:
+            point = Point(validated_data['longitude'], validated_data['latitude'], srid=4326)
+        regions = None
+        if validated_data.get('countries') or validated_data.get('provinces'):
+            regions = list(Country.objects.filter(id__in=validated_data.get('countries') or []).only('id'))
+            regions.extend(Province.objects.filter(id__in=validated_data.get('provinces') or []).only('id'))
+        return point, validated_data.get('distance'), regions, validated_data.get('categories') or []
+
+
+class ExportPOIsSerializer(POIFilterSerializer):
+    """
+    Serializer for POI export. Involves the POI filters, and:
+      format
+    """
+
+    format = ChoiceField(choices=sorted(WRITERS), default='geojson')
+
+    def create(self, validated_data):
+        return ExportPOIsAction(*self._filter_data(validated_data), validated_data['format'])
+
+
+class ClusterPOIsSerializer(CreateOnlySerializer):
+    """
+    Serializer for POI clustering. Involves:
+      west, south, east, north (the bounding box)
+      zoom
+    """
+
+    west = FloatField(min_value=-180, max_value=180, required=True)
+    south = FloatField(min_value=-90, max_value=90, required=True)
+    east = FloatField(min_value=-180, max_value=180, required=True)
+    north = FloatField(min_value=-90, max_value=90, required=True)
+    zoom = IntegerField(min_value=0, max_value=22, required=True)
+
+    def validate(self, attrs):
+        if attrs['west'] > attrs['east'] or attrs['south'] > attrs['north']:
+            raise ValidationError(_("Invalid bounding box"))
+        bbox = (attrs['west'], attrs['south'], attrs['east'], attrs['north'])
+        if count_cluster_cells(bbox, attrs['zoom']) > settings.POI_CLUSTERS_MAX_CELLS:
+            raise ValidationError(_("The bounding box is too large for this zoom level"))
+        return attrs
+
+    def create(self, validated_data):
+        return ClusterPOIsAction((validated_data['west'], validated_data['south'], validated_data['east'],
+                                  validated_data['north']), validated_data['zoom'])
+
+
+class SearchPOIsSerializer(POIFilterSerializer):
+    """
+    Serializer for POI search. Involves the POI filters, and:
+      text (optional)
+      min_rating (optional: the minimum rating average)
+      cursor (the "next" cursor of the previous page, if any)
+      limit
+    """
+
+    text = CharField(max_length=200, required=False, allow_blank=True)
+    min_rating = FloatField(min_value=0, max_value=10, required=False)
+    cursor = CursorField('search', required=False)
+    limit = IntegerField(min_value=1, max_value=MAX_PAGE_SIZE, default=50)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # Searches around a point are keyed by (distance, id), text searches by (rank, id), and the
+        # other ones by (id,).
+        keyed_by_two = 'latitude' in attrs or attrs.get('text')
+        if 'cursor' in attrs and len(attrs['cursor']) != (2 if keyed_by_two else 1):
+            raise ValidationError(_("The cursor does not belong to this search"))
+        return attrs
+
+    def create(self, validated_data):
+        return SearchPOIsAction(*self._filter_data(validated_data), validated_data.get('cursor'),
+                                validated_data['limit'], validated_data.get('text') or None,
+                                validated_data.get('min_rating'))
+
+
+class NearbyPOIsSerializer(CreateOnlySerializer):
+    """
+    Serializer for nearby POIs. Involves:
+      latitude, longitude and distance
+      cursor (the "next" cursor of the previous page, if any)
+      limit
+    """
+
+    latitude = FloatField(min_value=-90, max_value=90, required=True)
+    longitude = FloatField(min_value=-180, max_value=180, required=True)
+    distance = FloatField(min_value=0, required=True)
+    cursor = CursorField('nearby', required=False)
+    limit = IntegerField(min_value=1, max_value=MAX_PAGE_SIZE, default=50)
+
+    def validate(self, attrs):
+        if 'cursor' in attrs and len(attrs['cursor']) != 2:
+            raise ValidationError(_("Invalid cursor"))
+        return attrs
+
+    def create(self, validated_data):
+        return NearbyPOIsAction(Point(validated_data['longitude'], validated_data['latitude'], srid=4326),
+                                validated_data['distance'], validated_data.get('cursor'), validated_data['limit'])
+
+
+class NearestPOIsSerializer(CreateOnlySerializer):
+    """
+    Serializer for the nearest POIs. Involves:
+      latitude and longitude
+      k (how many POIs)
+      max_distance (optional)
+    """
+
+    latitude = FloatField(min_value=-90, max_value=90, required=True)
+    longitude = FloatField(min_value=-180, max_value=180, required=True)
+    k = IntegerField(min_value=1, max_value=MAX_PAGE_SIZE, default=20)
+    max_distance = FloatField(min_value=0, required=False)
+
+    def create(self, validated_data):
+        return NearestPOIsAction(Point(validated_data['longitude'], validated_data['latitude'], srid=4326),
+                                 validated_data['k'], validated_data.get('max_distance'))
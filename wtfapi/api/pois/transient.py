@@ -0,0 +1,61 @@
+class ExportPOIsAction:
+    """
+    Action parsed from the POI export endpoint.
+    """
+
+    def __init__(self, point, distance, regions, categories, format):
+        self.point = point
+        self.distance = distance
+        self.regions = regions
+        self.categories = categories
+        self.format = format
+
+
+class ClusterPOIsAction:
+    """
+    Action parsed from the POI clustering endpoint.
+    """
+
+    def __init__(self, bbox, zoom):
+        self.bbox = bbox
+        self.zoom = zoom
+
+
+class SearchPOIsAction:
+    """
+    Action parsed from the POI search endpoint.
+    """
+
+    def __init__(self, point, distance, regions, categories, after, limit, text=None, min_rating=None):
+        self.point = point
+        self.distance = distance
+        self.regions = regions
+        self.categories = categories
+        self.after = after
+        self.limit = limit
+        self.text = text
+        self.min_rating = min_rating
+
+
+class NearbyPOIsAction:
+    """
+    Action parsed from the nearby POIs endpoint.
+    """
+
+    def __init__(self, point, distance, after, limit):
+        self.point = point
+        self.distance = distance
+        self.after = after
+        self.limit = limit
+        self.text = None
+
+
+class NearestPOIsAction:
+    """
+    Action parsed from the nearest POIs endpoint.
+    """
+
+    def __init__(self, point, k, max_distance):
+        self.point = point
+        self.k = k
+        self.max_distance = max_distance
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse, HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..base_views import LoginRequiredAPIView
+from ..cursors import encode_cursor
+from .serializers import *
+from ...exports import CONTENT_TYPES, WRITERS, filter_pois
+from ...models import POI
+from ...tiles import is_valid_tile, get_poi_tile
+
+
+class ExportPOIsAPIView(LoginRequiredAPIView):
+    """
+    This is the POI export endpoint. It is expected a get call with the POI filter parameters,
+      and a format (geojson or ndjson). The response is streamed as the rows are read.
+    """
+
+    def get(self, request):
+        serializer = ExportPOIsSerializer(data=request.GET)
+        serializer.is_valid(True)
+        action = serializer.save()
+        queryset = filter_pois(POI.objects.all(), action.point, action.distance, action.regions, action.categories)
+        response = StreamingHttpResponse(WRITERS[action.format](queryset), content_type=CONTENT_TYPES[action.format])
+        response['Content-Disposition'] = 'attachment; filename="pois.%s"' % action.format
+        return response
+
+
+class POITileAPIView(APIView):
+    """
+    This is the POI vector tile endpoint. It serves Mapbox Vector Tiles for the z/x/y
+      tile given in the URL, and needs no authentication.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request, z, x, y):
+        if not is_valid_tile(z, x, y):
+            raise NotFound()
+        return HttpResponse(get_poi_tile(z, x, y), content_type='application/vnd.mapbox-vector-tile')
+
+
+class ClusterPOIsAPIView(APIView):
+    """
+    This is the POI clustering endpoint. It is expected a get call with parameters being the
+      west, south, east and north bounds, and the zoom level. Instead of the POIs, it returns
+      the count and centroid of each cluster of POIs.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request):
+        serializer = ClusterPOIsSerializer(data=request.GET)
+        serializer.is_valid(True)
+        action = serializer.save()
+        clusters = POI.objects.clusters(action.bbox, action.zoom)
+        return Response([
+            {'count': cluster['count'], 'longitude': cluster['centroid'].x, 'latitude': cluster['centroid'].y}
+            for cluster in clusters
+        ], status=status.HTTP_200_OK)
+
+
+def _page_response(queryset, action, scope):
+    # Renders a keyset-paginated page of POIs (distance-ordered ones if a point was given, or
+    # rank-ordered ones if just a text was given), with the cursor of the next page (if there may
+    # be one) and, in debug mode, the query plan.
+    fields = ['id', 'name', 'description', 'location', 'rating_average'] + \
+             (['distance'] if action.point else []) + (['rank'] if action.text else [])
+    results = []
+    for poi in queryset.values(*fields):
+        distance = poi.get('distance')
+        result = {'id': poi['id'], 'name': poi['name'], 'description': poi['description'],
+                  'longitude': poi['location'].x, 'latitude': poi['location'].y,
+                  'rating_average': poi['rating_average'],
+                  # Distance annotations may come as measures.
+                  'distance': getattr(distance, 'm', distance)}
+        if action.text:
+            result['rank'] = poi['rank']
+        results.append(result)
+    following = None
+    if len(results) == action.limit:
+        last = results[-1]
+        if action.point:
+            key = (last['distance'], last['id'])
+        elif action.text:
+            key = (last['rank'], last['id'])
+        else:
+            key = (last['id'],)
+        following = encode_cursor(key, scope)
+    data = {'results': results, 'next': following}
+    if settings.DEBUG:
+        data['explain'] = queryset.explain()
+    return Response(data, status=status.HTTP_200_OK)
+
+
+class SearchPOIsAPIView(APIView):
+    """
+    This is the POI search endpoint. It is expected a get call with the POI filter parameters,
+      an optional text, an optional minimum rating average, a limit and, for the pages after the
+      first one, the cursor given as "next" in the previous page. Results are ordered by distance
+      when a point is given, by relevance when just a text is given, and by id otherwise. In
+      debug mode, the query plan is also returned.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request):
+        serializer = SearchPOIsSerializer(data=request.GET)
+        serializer.is_valid(True)
+        action = serializer.save()
+        queryset = POI.objects.annotate_rating_average()
+        if action.min_rating is not None:
+            queryset = queryset.filter(rating_average__gte=action.min_rating)
+        queryset = queryset.search(action.point, action.distance, action.regions, action.categories,
+                                   action.after, action.limit, text=action.text)
+        return _page_response(queryset, action, 'search')
+
+
+class NearbyPOIsAPIView(APIView):
+    """
+    This is the nearby POIs endpoint. It is expected a get call with parameters being latitude,
+      longitude and distance, a limit and, for the pages after the first one, the cursor given
+      as "next" in the previous page. Results are ordered by distance, and every page costs the
+      same no matter how deep it is.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request):
+        serializer = NearbyPOIsSerializer(data=request.GET)
+        serializer.is_valid(True)
+        action = serializer.save()
+        queryset = POI.objects.annotate_rating_average().nearby_search(action.point, action.distance)
+        queryset = queryset.keyset(('distance', 'id'), action.after, action.limit)
+        return _page_response(queryset, action, 'nearby')
+
+
+class NearestPOIsAPIView(APIView):
+    """
+    This is the nearest POIs endpoint. It is expected a get call with parameters being latitude,
+      longitude, k and, optionally, max_distance. The k POIs closest to the point are returned,
+      ordered by distance, with no radius to guess: the cost depends on k, not on how many POIs
+      lie around the point.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request):
+        serializer = NearestPOIsSerializer(data=request.GET)
+        serializer.is_valid(True)
+        action = serializer.save()
+        queryset = POI.objects.annotate_rating_average().nearest(action.point, action.k, action.max_distance)
+        return Response([
+            {'id': poi['id'], 'name': poi['name'], 'description': poi['description'],
+             'longitude': poi['location'].x, 'latitude': poi['location'].y,
+             'rating_average': poi['rating_average'], 'distance': poi['distance']}
+            for poi in queryset.values('id', 'name', 'description', 'location', 'rating_average', 'distance')
+        ], status=status.HTTP_200_OK)
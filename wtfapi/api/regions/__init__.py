@@ -0,0 +1,6 @@
+"""
+Regions: This clump of functions exposes the region features for the API.
+
+Their functions are like:
+  - Reverse geocoding of {latitude} {longitude} into its country and province.
+"""
@@ -0,0 +1,18 @@
+from django.contrib.gis.geos import Point
+from rest_framework.serializers import FloatField
+from ..account.serializers import CreateOnlySerializer
+from .transient import *
+
+
+class ReverseGeocodeSerializer(CreateOnlySerializer):
+    """
+    Serializer for reverse geocoding. Involves:
+      latitude
+      longitude
+    """
+
+    latitude = FloatField(min_value=-90, max_value=90, required=True)
+    longitude = FloatField(min_value=-180, max_value=180, required=True)
+
+    def create(self, validated_data):
+        return ReverseGeocodeAction(Point(validated_data['longitude'], validated_data['latitude'], srid=4326))
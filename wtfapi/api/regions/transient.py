@@ -0,0 +1,7 @@
+class ReverseGeocodeAction:
+    """
+    Action parsed from the reverse geocoding endpoint.
+    """
+
+    def __init__(self, point):
+        self.point = point
@@ -0,0 +1,30 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from ...geocoding import region_index
+from .serializers import *
+
+
+class ReverseGeocodeAPIView(APIView):
+    """
+    This is the reverse geocoding endpoint. It is expected a get call with parameters being
+      latitude and longitude. It is resolved against the in-memory region index, and needs
+      no authentication.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    @staticmethod
+    def _region_data(region):
+        return region and {'id': region.id, 'name': region.name}
+
+    def get(self, request):
+        serializer = ReverseGeocodeSerializer(data=request.GET)
+        serializer.is_valid(True)
+        action = serializer.save()
+        country, province = region_index.lookup(action.point)
+        return Response({
+            'country': self._region_data(country),
+            'province': self._region_data(province)
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,166 @@
+"""
+Sliding-window throttling of the account endpoints, per client IP and per username. Counters are
+  kept in a pluggable store (see the ACCOUNT_THROTTLE_* settings): an in-memory one (per process,
+  fit for tests and development) or a Redis one (shared among all the processes).
+
+Each window is approximated by two consecutive fixed buckets: the count of the previous bucket is
+  weighted by how much of it still overlaps the window. This needs just two counters per key.
+"""
+
+
+import time
+from hashlib import sha256
+from threading import Lock
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from rest_framework.authentication import get_authorization_header
+from rest_framework.throttling import BaseThrottle
+
+
+class MemoryThrottleStore:
+    """
+    Keeps the counters in the memory of the current process.
+    """
+
+    MAX_ENTRIES = 100000
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = Lock()
+
+    def _purge(self, now):
+        for entry in [entry for entry in self._counters if entry[2] < now // entry[1] - 1]:
+            del self._counters[entry]
+
+    def hit(self, key, window, now):
+        """
+        Counts a hit on a key.
+        :param key: The throttled key.
+        :param window: The window size, in seconds.
+        :param now: The current timestamp.
+        :return: A (previous, current) tuple with the hits in the previous and current buckets.
+        """
+
+        bucket = int(now // window)
+        with self._lock:
+            if len(self._counters) >= self.MAX_ENTRIES:
+                self._purge(now)
+            current = self._counters.get((key, window, bucket), 0) + 1
+            self._counters[(key, window, bucket)] = current
+            return self._counters.get((key, window, bucket - 1), 0), current
+
+
+class RedisThrottleStore:
+    """
+    Keeps the counters in Redis, expiring them as soon as they are no longer needed.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0'):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('The redis package is needed to use the redis throttle store')
+        self._client = redis.Redis.from_url(url)
+
+    def hit(self, key, window, now):
+        """
+        Counts a hit on a key. See `MemoryThrottleStore.hit`.
+        """
+
+        bucket = int(now // window)
+        name = 'wtfapi:throttle:%s:%d:%d' % (key, window, bucket)
+        pipeline = self._client.pipeline()
+        pipeline.incr(name)
+        pipeline.expire(name, window * 2)
+        pipeline.get('wtfapi:throttle:%s:%d:%d' % (key, window, bucket - 1))
+        current, _, previous = pipeline.execute()
+        return int(previous or 0), current
+
+
+_store = None
+_store_lock = Lock()
+
+
+def get_throttle_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(settings.ACCOUNT_THROTTLE_STORE)(**settings.ACCOUNT_THROTTLE_STORE_OPTIONS)
+    return _store
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Base sliding-window throttle. Subclasses tell the rate (an entry of ACCOUNT_THROTTLE_RATES)
+      and how to identify the client.
+    """
+
+    rate = None
+
+    def __init__(self):
+        self._wait = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request)
+        if key is None:
+            return True
+        limit, window = settings.ACCOUNT_THROTTLE_RATES[self.rate]
+        now = time.time()
+        previous, current = get_throttle_store().hit('%s:%s' % (self.rate, key), window, now)
+        remaining = 1 - (now % window) / window
+        if previous * remaining + current <= limit:
+            return True
+        self._wait = window * remaining
+        return False
+
+    def wait(self):
+        return self._wait
+
+
+class IPThrottle(SlidingWindowThrottle):
+    """
+    Throttles by client IP (honoring the NUM_PROXIES setting of the framework).
+    """
+
+    rate = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class UsernameThrottle(SlidingWindowThrottle):
+    """
+    Throttles by the username given in the request or, lacking one, by the presented token.
+    """
+
+    rate = 'username'
+
+    def get_key(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if isinstance(username, str) and username:
+            return 'user:' + sha256(username.lower().encode()).hexdigest()
+        auth = get_authorization_header(request)
+        if auth:
+            return 'auth:' + sha256(auth).hexdigest()
+        return None
+
+
+class EarlyThrottledAPIViewMixin:
+    """
+    Checks the `early_throttle_classes` before anything else is done with the request (i.e. before
+      authenticating it), so rejected requests cost no database nor password hashing work.
+    """
+
+    early_throttle_classes = (IPThrottle, UsernameThrottle)
+
+    def initial(self, request, *args, **kwargs):
+        for throttle_class in self.early_throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+        super().initial(request, *args, **kwargs)
@@ -0,0 +1,21 @@
+from django.urls import path
+from .account.views import ReorderBookmarks, BatchRatePOIs, BatchBookmarkPOIs, RequestPasswordReset, \
+    ResetPassword
+from .pois.views import ExportPOIsAPIView, ClusterPOIsAPIView, SearchPOIsAPIView, \
+    NearbyPOIsAPIView, NearestPOIsAPIView
+from .regions.views import ReverseGeocodeAPIView
+
+
+urlpatterns = [
+    path('account/password/reset/request/', RequestPasswordReset.as_view(), name='request-password-reset'),
+    path('account/password/reset/', ResetPassword.as_view(), name='reset-password'),
+    path('account/ratings/batch/', BatchRatePOIs.as_view(), name='batch-rate-pois'),
+    path('account/bookmarks/batch/', BatchBookmarkPOIs.as_view(), name='batch-bookmark-pois'),
+    path('account/bookmarks/reorder/', ReorderBookmarks.as_view(), name='reorder-bookmarks'),
+    path('pois/export/', ExportPOIsAPIView.as_view(), name='export-pois'),
+    path('pois/search/', SearchPOIsAPIView.as_view(), name='search-pois'),
+    path('pois/nearby/', NearbyPOIsAPIView.as_view(), name='nearby-pois'),
+    path('pois/nearest/', NearestPOIsAPIView.as_view(), name='nearest-pois'),
+    path('pois/clusters/', ClusterPOIsAPIView.as_view(), name='cluster-pois'),
+    path('regions/reverse/', ReverseGeocodeAPIView.as_view(), name='reverse-geocode'),
+]
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class WtfapiConfig(AppConfig):
     name = 'wtfapi'
+
+    def ready(self):
+        from . import signals, generations
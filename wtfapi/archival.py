@@ -0,0 +1,108 @@
+"""
+Archival of soft-deleted records. POIs, provinces and countries deleted (i.e. last updated while
+  deleted) more than ARCHIVE_RETENTION seconds ago are moved into the `ArchivedRecord` table, in
+  batches, each one in its own short transaction. Every row is moved with a single statement:
+
+    WITH moved AS (DELETE FROM <table> WHERE ... RETURNING *)
+    INSERT INTO <archive> ... SELECT ... FROM moved
+
+The rows depending on an archived record are moved along with it (e.g. the ratings, bookmarks
+  and category links of a POI), before it. Derived rows (region membership and pieces) are just
+  deleted, since they can be recomputed. Countries still having provinces are kept until those
+  are archived too.
+"""
+
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import POI, Country, Province, Rating, Bookmark, ArchivedRecord
+from .tiles import invalidate_all as invalidate_all_tiles
+
+
+def _move(cursor, model, column, ids):
+    # Moves the rows of a model having one of the given ids in a column into the archive.
+    cursor.execute(
+        'WITH moved AS (DELETE FROM {table} WHERE {column} = ANY(%s) RETURNING *) '
+        'INSERT INTO {archive} (archived_on, model, record_id, data) '
+        'SELECT now(), %s, moved.id, to_jsonb(moved) FROM moved'.format(
+            table=model._meta.db_table, column=column, archive=ArchivedRecord._meta.db_table
+        ), [ids, model._meta.label_lower]
+    )
+    return cursor.rowcount
+
+
+def _delete(cursor, model, column, ids):
+    # Deletes (without archiving) the rows of a model having one of the given ids in a column.
+    cursor.execute('DELETE FROM {table} WHERE {column} = ANY(%s)'.format(table=model._meta.db_table, column=column),
+                   [ids])
+
+
+def _archive_pois(cursor, ids):
+    _move(cursor, Rating, 'poi_id', ids)
+    _move(cursor, Bookmark, 'poi_id', ids)
+    _move(cursor, POI.categories.through, 'poi_id', ids)
+    _delete(cursor, POI.countries.through, 'poi_id', ids)
+    _delete(cursor, POI.provinces.through, 'poi_id', ids)
+    return _move(cursor, POI, 'id', ids)
+
+
+def _archive_regions(model):
+    def _archive(cursor, ids):
+        _delete(cursor, model.pois.through, model._meta.model_name + '_id', ids)
+        _delete(cursor, model._meta.get_field('pieces').related_model, 'region_id', ids)
+        return _move(cursor, model, 'id', ids)
+    return _archive
+
+
+def _archive_batch(queryset, archive, batch_size):
+    with transaction.atomic():
+        ids = list(queryset.select_for_update(skip_locked=True).order_by('id').values_list('id', flat=True)
+                   [:batch_size])
+        if ids:
+            with connection.cursor() as cursor:
+                archive(cursor, ids)
+    return len(ids)
+
+
+def archive_deleted(retention=None, batch_size=None, pause=None):
+    """
+    Archives the soft-deleted POIs, provinces and countries.
+    :param retention: How long (in seconds) deleted records stay in their tables. By default,
+      ARCHIVE_RETENTION.
+    :param batch_size: How many records to archive per transaction. By default, ARCHIVE_BATCH_SIZE.
+    :param pause: How long (in seconds) to sleep between batches, so archiving does not starve
+      the regular traffic. By default, ARCHIVE_BATCH_PAUSE.
+    :return: A dictionary of model label => number of archived records (not counting the
+      dependent ones).
+    """
+
+    retention = settings.ARCHIVE_RETENTION if retention is None else retention
+    batch_size = settings.ARCHIVE_BATCH_SIZE if batch_size is None else batch_size
+    pause = settings.ARCHIVE_BATCH_PAUSE if pause is None else pause
+    before = timezone.now() - timedelta(seconds=retention)
+
+    # Provinces go before countries, so their countries may be archived in the same run.
+    steps = [
+        (POI, POI.all_objects.dead().filter(updated_on__lt=before), _archive_pois),
+        (Province, Province.all_objects.dead().filter(updated_on__lt=before), _archive_regions(Province)),
+        (Country, Country.all_objects.dead().filter(updated_on__lt=before)
+                          .exclude(id__in=Province.all_objects.values('country_id')), _archive_regions(Country)),
+    ]
+    archived = {}
+    for model, queryset, archive in steps:
+        total = 0
+        while True:
+            count = _archive_batch(queryset, archive, batch_size)
+            total += count
+            if count < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        archived[model._meta.label_lower] = total
+    # Archived rows send no signals, so the cached tiles are dropped at once.
+    if archived[POI._meta.label_lower]:
+        invalidate_all_tiles()
+    return archived
@@ -0,0 +1,81 @@
+"""
+The category tree, precomputed as a map from each category id to the ids of all its descendants
+  (itself included). Filtering POIs by a parent category then becomes a single IN list over the
+  POI/category link table, instead of walking the tree with recursive queries.
+
+The map is versioned by a generation number (see `wtfapi.generations`), and the default cache also
+  holds the map of the current generation, so processes share the computation. Saving or deleting
+  a category bumps the generation.
+"""
+
+
+from django.core.cache import cache
+from category.models import Category
+from .generations import GenerationCache
+
+
+class CategoryTree(GenerationCache):
+    """
+    The cached map of category descendants.
+    """
+
+    GENERATION_KEY = 'wtfapi:category-tree:generation'
+    CHECK_INTERVAL_SETTING = 'CATEGORY_TREE_CHECK_INTERVAL'
+    MAP_KEY = 'wtfapi:category-tree:%d'
+
+    def _load(self, generation):
+        # The map of the current generation is shared through the cache.
+        key = self.MAP_KEY % generation
+        descendants = cache.get(key)
+        if descendants is None:
+            descendants = self._compute()
+            cache.set(key, descendants, None)
+        return descendants
+
+    @staticmethod
+    def _compute():
+        children = {}
+        for category_id, parent_id in Category.objects.values_list('id', 'parent_id'):
+            children.setdefault(category_id, [])
+            if parent_id is not None:
+                children.setdefault(parent_id, []).append(category_id)
+
+        descendants = {}
+
+        def _collect(category_id):
+            # Iterative, so deep trees do not hit the recursion limit.
+            result, pending = [], [category_id]
+            while pending:
+                current = pending.pop()
+                result.append(current)
+                pending.extend(children.get(current, ()))
+            return frozenset(result)
+
+        for category_id in children:
+            descendants[category_id] = _collect(category_id)
+        return descendants
+
+    def invalidate(self):
+        """
+        Drops the map in this process and, through the cache, in all the others.
+        """
+
+        generation = super().invalidate()
+        cache.delete(self.MAP_KEY % (generation - 1))
+
+    def descendants(self, categories):
+        """
+        Expands categories to themselves and all their descendants.
+        :param categories: An iterable of categories, or category ids.
+        :return: A set of category ids. Unknown categories are kept as they are.
+        """
+
+        descendants = self._get()
+        result = set()
+        for category in categories:
+            category_id = category.pk if isinstance(category, Category) else category
+            result |= descendants.get(category_id, {category_id})
+        return result
+
+
+category_tree = CategoryTree()
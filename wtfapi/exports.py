@@ -0,0 +1,97 @@
+"""
+Streaming POI export, as a GeoJSON FeatureCollection or as NDJSON (one feature per line).
+
+Rows are read through a server-side cursor and serialized as they come (the geometries are
+  serialized by PostGIS itself), so memory usage stays flat regardless of the exported size.
+"""
+
+
+import json
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Q
+
+
+CONTENT_TYPES = {
+    'geojson': 'application/geo+json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def filter_pois(queryset, point=None, distance=None, regions=None, categories=None):
+    """
+    Applies the export filters to a POI queryset.
+    :param queryset: The POIs to filter.
+    :param point: The center of the search, if any.
+    :param distance: The search radius, in meters, if a point is given.
+    :param regions: The regions (countries or provinces) to search in, if any.
+    :param categories: The category ids to search in (descendants included), if any.
+    :return: A new queryset for those conditions.
+    """
+
+    if point is not None:
+        queryset = queryset.within(point, distance)
+    if regions is not None:
+        queryset = queryset.in_region(regions)
+    if categories:
+        queryset = queryset.in_categories(categories)
+    return queryset
+
+
+def iter_features(queryset, chunk_size=2000):
+    """
+    Iterates over the given POIs, as serialized GeoJSON features.
+    :param queryset: The POIs to export.
+    :param chunk_size: How many rows to fetch from the server-side cursor at once.
+    :return: A generator of feature strings.
+    """
+
+    rows = queryset.annotate(
+        geometry=AsGeoJSON('location'),
+        category_slugs=ArrayAgg('categories__slug', filter=Q(categories__isnull=False))
+    ).values_list('id', 'name', 'description', 'geometry', 'category_slugs').iterator(chunk_size)
+    for poi_id, name, description, geometry, categories in rows:
+        yield '{"type": "Feature", "id": %d, "geometry": %s, "properties": %s}' % (poi_id, geometry, json.dumps({
+            'name': name, 'description': description, 'categories': categories
+        }))
+
+
+def _buffered(strings, size):
+    buffer = []
+    for string in strings:
+        buffer.append(string)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_geojson(queryset, chunk_size=2000):
+    """
+    Iterates over the given POIs, as chunks of a GeoJSON FeatureCollection document.
+    """
+
+    def _parts():
+        yield '{"type": "FeatureCollection", "features": ['
+        separator = ''
+        for feature in iter_features(queryset, chunk_size):
+            yield separator + feature
+            separator = ','
+        yield ']}\n'
+
+    return _buffered(_parts(), chunk_size)
+
+
+def iter_ndjson(queryset, chunk_size=2000):
+    """
+    Iterates over the given POIs, as chunks of NDJSON lines.
+    """
+
+    return _buffered((feature + '\n' for feature in iter_features(queryset, chunk_size)), chunk_size)
+
+
+WRITERS = {
+    'geojson': iter_geojson,
+    'ndjson': iter_ndjson,
+}
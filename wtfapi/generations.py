@@ -0,0 +1,86 @@
+"""
+Per-process caches of derived data (e.g. the region index, or the category tree), invalidated
+  across processes by a generation number kept in the default cache. Invalidating bumps the
+  generation, and each process checks it every few seconds, reloading its data when it changed.
+
+The default cache must be shared by all the processes (see the `wtfapi.E001` check): otherwise,
+  the generation bumps would never reach the other processes.
+"""
+
+
+import time
+from threading import Lock
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class GenerationCache:
+    """
+    Holds some data, loaded lazily and reloaded whenever its generation changes. Subclasses
+      must define `GENERATION_KEY`, `CHECK_INTERVAL_SETTING` (the name of the setting telling
+      how often, in seconds, the generation is checked), and `_load` (given the generation).
+    """
+
+    GENERATION_KEY = None
+    CHECK_INTERVAL_SETTING = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._data = None
+        self._generation = None
+        self._checked_on = 0
+
+    def _load(self, generation):
+        raise NotImplementedError
+
+    @classmethod
+    def current_generation(cls):
+        """
+        The current generation number, as seen by every process.
+        """
+
+        return cache.get_or_set(cls.GENERATION_KEY, 0, None)
+
+    def _get(self):
+        data = self._data
+        now = time.monotonic()
+        if data is not None and now - self._checked_on < getattr(settings, self.CHECK_INTERVAL_SETTING):
+            return data
+
+        with self._lock:
+            generation = self.current_generation()
+            if self._data is None or generation != self._generation:
+                self._data = self._load(generation)
+                self._generation = generation
+            self._checked_on = now
+            return self._data
+
+    def invalidate(self):
+        """
+        Drops the data in this process and, through the cache, in all the others.
+        :return: The new generation number.
+        """
+
+        with self._lock:
+            self._data = None
+            try:
+                return cache.incr(self.GENERATION_KEY)
+            except ValueError:
+                cache.set(self.GENERATION_KEY, 1, None)
+                return 1
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_default_cache(app_configs, **kwargs):
+    if settings.DEBUG or not isinstance(caches['default'], (LocMemCache, DummyCache)):
+        return []
+    return [checks.Error(
+        'The default cache is not shared between processes.',
+        hint='Generation numbers (e.g. of the region index or the category tree) are kept in the default '
+             'cache, so invalidations would never reach the other processes. Use a shared backend (e.g. '
+             'the database, memcached or redis).',
+        id='wtfapi.E001',
+    )]
@@ -0,0 +1,68 @@
+"""
+Reverse geocoding: resolves a point to the country and province it lies in. Boundaries are kept in
+  memory as prepared geometries (one per polygon, each one with its bounding box), so lookups do not
+  hit the database at all once the index is loaded.
+
+The index is loaded lazily, and dropped whenever a region is saved or deleted. Other processes notice
+  it through a generation number kept in the default cache, which is checked every few seconds.
+"""
+
+
+from collections import namedtuple
+from .generations import GenerationCache
+from .models import Country, Province
+from .models.spatial import as_geography_srid
+
+
+IndexedRegion = namedtuple('IndexedRegion', ('id', 'name', 'extent', 'prepared'))
+
+
+class RegionIndex(GenerationCache):
+    """
+    An in-memory index of the country and province boundaries. Countries are scanned first, and
+      then only the provinces of the matched country.
+    """
+
+    GENERATION_KEY = 'wtfapi:region-index:generation'
+    CHECK_INTERVAL_SETTING = 'REVERSE_GEOCODING_CHECK_INTERVAL'
+
+    @staticmethod
+    def _entries(region):
+        return [IndexedRegion(region.id, region.name, polygon.extent, polygon.prepared)
+                for polygon in region.boundaries]
+
+    def _load(self, generation):
+        countries = []
+        provinces = {}
+        for country in Country.objects.all().only('id', 'name', 'boundaries'):
+            countries.extend(self._entries(country))
+        for province in Province.objects.all().only('id', 'name', 'country_id', 'boundaries'):
+            provinces.setdefault(province.country_id, []).extend(self._entries(province))
+        return countries, provinces
+
+    @staticmethod
+    def _match(entries, point):
+        x, y = point.x, point.y
+        for entry in entries:
+            xmin, ymin, xmax, ymax = entry.extent
+            if xmin <= x <= xmax and ymin <= y <= ymax and entry.prepared.intersects(point):
+                return entry
+        return None
+
+    def lookup(self, point):
+        """
+        Resolves the country and province of a point.
+        :param point: The point to resolve.
+        :return: A (country, province) tuple of `IndexedRegion` entries, any of them being None if
+          not found.
+        """
+
+        point = as_geography_srid(point)
+        countries, provinces = self._get()
+        country = self._match(countries, point)
+        if country is None:
+            return None, None
+        return country, self._match(provinces.get(country.id, ()), point)
+
+
+region_index = RegionIndex()
@@ -0,0 +1,181 @@
+"""
+Bulk POI import: streaming readers for CSV, GeoJSON and NDJSON sources, and a batched loader
+  which inserts POIs (and their category links) with multi-row INSERTs instead of one (or more)
+  query per POI.
+
+Every reader yields `ImportRecord` objects:
+  - CSV: a header row with `name`, `description`, `longitude`, `latitude` and, optionally,
+    `categories` (slugs separated by `|`) and `internal_notes`.
+  - GeoJSON: a FeatureCollection of Point features, having the other fields as properties.
+    Categories are given as a list of slugs.
+  - NDJSON: one object per line, being either a GeoJSON Point feature or a flat object with
+    the same keys the CSV format has.
+"""
+
+
+import csv
+import json
+import time
+from collections import namedtuple
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from category.models import Category
+from .models import POI
+from .tiles import invalidate_all as invalidate_all_tiles
+
+
+ImportRecord = namedtuple('ImportRecord', ('name', 'description', 'longitude', 'latitude', 'categories',
+                                           'internal_notes'))
+
+
+def _split_categories(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [slug.strip() for slug in value.split('|') if slug.strip()]
+    return list(value)
+
+
+def _record_from_mapping(data):
+    if data.get('type') == 'Feature':
+        longitude, latitude = data['geometry']['coordinates'][:2]
+        data = dict(data.get('properties') or {}, longitude=longitude, latitude=latitude)
+    return ImportRecord(data['name'], data.get('description') or '', float(data['longitude']),
+                        float(data['latitude']), _split_categories(data.get('categories')),
+                        data.get('internal_notes') or None)
+
+
+def read_csv(stream):
+    """
+    Reads POI records from a CSV stream.
+    """
+
+    for row in csv.DictReader(stream):
+        yield _record_from_mapping(row)
+
+
+def read_ndjson(stream):
+    """
+    Reads POI records from a newline-delimited JSON stream.
+    """
+
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield _record_from_mapping(json.loads(line))
+
+
+def read_geojson(stream, chunk_size=1 << 16):
+    """
+    Reads POI records from a GeoJSON FeatureCollection stream. Features are decoded one by one
+      from the "features" array, so the whole document is never held in memory.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer, position = '', -1
+
+    def _more():
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            raise ValueError('Unexpected end of the GeoJSON stream')
+        return chunk
+
+    # Find the start of the features array.
+    while position < 0:
+        buffer += _more()
+        key = buffer.find('"features"')
+        if key >= 0:
+            position = buffer.find('[', key)
+    position += 1
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            buffer, position = _more(), 0
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # The feature is not complete yet: keep its beginning, and read more.
+            buffer, position = buffer[position:] + _more(), 0
+            continue
+        yield _record_from_mapping(feature)
+        position = end
+
+
+READERS = {
+    'csv': read_csv,
+    'geojson': read_geojson,
+    'ndjson': read_ndjson,
+}
+
+
+class POIImporter:
+    """
+    Loads POI records in batches. Each batch is inserted in its own transaction: the POIs with
+      a single multi-row INSERT, their category links with another one, and their region
+      membership with a couple of INSERT ... SELECT statements. Then, the cached POI tiles are
+      invalidated at once.
+    """
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.unknown_categories = set()
+
+    def _load_batch(self, records):
+        through = POI.categories.through
+        with transaction.atomic():
+            pois = POI.objects.bulk_create([
+                POI(name=record.name, description=record.description, internal_notes=record.internal_notes,
+                    location=Point(record.longitude, record.latitude, srid=4326))
+                for record in records
+            ])
+            links = []
+            for poi, record in zip(pois, records):
+                for slug in record.categories:
+                    category_id = self.categories.get(slug)
+                    if category_id is None:
+                        self.unknown_categories.add(slug)
+                    else:
+                        links.append(through(poi_id=poi.id, category_id=category_id))
+            through.objects.bulk_create(links, ignore_conflicts=True)
+            POI.objects.filter(id__in=[poi.id for poi in pois]).refresh_regions()
+            transaction.on_commit(invalidate_all_tiles)
+
+    def run(self, records, skip=0, on_batch=None):
+        """
+        Imports all the records, in batches.
+        :param records: An iterable of `ImportRecord` objects.
+        :param skip: How many leading records to skip (i.e. already imported ones).
+        :param on_batch: An optional callback invoked after each batch is committed, with the
+          total of processed records (including the skipped ones) and the rate, in records per
+          second, of that batch.
+        :return: The total of processed records (including the skipped ones).
+        """
+
+        done = 0
+        batch = []
+        for record in records:
+            if done < skip:
+                done += 1
+                continue
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                done = self._commit(batch, done, on_batch)
+                batch = []
+        if batch:
+            done = self._commit(batch, done, on_batch)
+        return done
+
+    def _commit(self, batch, done, on_batch):
+        started = time.perf_counter()
+        self._load_batch(batch)
+        elapsed = time.perf_counter() - started
+        done += len(batch)
+        if on_batch:
+            on_batch(done, len(batch) / elapsed if elapsed else float('inf'))
+        return done
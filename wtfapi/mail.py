@@ -0,0 +1,148 @@
+"""
+Outgoing e-mail. Messages are not sent when requested: `OutboxEmailBackend` (the EMAIL_BACKEND)
+  just queues them in the outbox table, and `flush_outbox` (run periodically by the celery beat)
+  sends them in batches through MAIL_OUTBOX_BACKEND.
+
+Each worker process keeps its delivery connection open between batches, so many messages take
+  one SMTP connection instead of one each. Messages given a `dedup_key` attribute (see
+  `User.email_user`) are dropped if another one with the same key was queued in the last
+  MAIL_OUTBOX_DEDUP_WINDOW seconds. Messages which cannot be stored (i.e. having prebuilt MIME
+  attachments) are sent right away, through MAIL_OUTBOX_BACKEND.
+
+Each batch is claimed in a short transaction, and then sent with no transaction (nor row locks)
+  open. Claims expire after MAIL_OUTBOX_CLAIM_TIMEOUT seconds, so the messages of a sender that
+  died while sending them are eventually sent by another one. Failed messages keep their claim,
+  so they are retried (by any sender) once it expires, and not right away.
+
+A message is never sent twice because of a retry: delivery errors are not retried in place (the
+  server may have accepted the message before failing), and idle connections are probed before
+  sending, so the ones closed by the server are replaced beforehand.
+"""
+
+
+import smtplib
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxMessage
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """
+    Queues the messages in the outbox table.
+    """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        storable = [message for message in email_messages if OutboxMessage.is_storable(message)]
+        direct = [message for message in email_messages if not OutboxMessage.is_storable(message)]
+        try:
+            count = OutboxMessage.objects.enqueue(storable, settings.MAIL_OUTBOX_DEDUP_WINDOW) if storable else 0
+            if direct:
+                count += get_connection(settings.MAIL_OUTBOX_BACKEND, fail_silently=self.fail_silently)\
+                    .send_messages(direct) or 0
+            return count
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+
+
+_connection = None
+
+
+def _is_alive(connection):
+    # Only the SMTP connections are probed: the other backends hold no server connection.
+    smtp = getattr(connection, 'connection', None)
+    if smtp is None:
+        return True
+    try:
+        return smtp.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _get_connection():
+    global _connection
+    if _connection is not None and not _is_alive(_connection):
+        # The server closed the (idle) connection: open a new one.
+        _drop_connection()
+    if _connection is None:
+        _connection = get_connection(settings.MAIL_OUTBOX_BACKEND)
+    # Does nothing if it is already open.
+    _connection.open()
+    return _connection
+
+
+def _drop_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+        _connection = None
+
+
+def _claim_batch():
+    with transaction.atomic():
+        batch = list(OutboxMessage.objects.claimable(settings.MAIL_OUTBOX_MAX_ATTEMPTS,
+                                                     settings.MAIL_OUTBOX_CLAIM_TIMEOUT)
+                     .select_for_update(skip_locked=True).order_by('created_on')[:settings.MAIL_OUTBOX_BATCH_SIZE])
+        now = timezone.now()
+        for message in batch:
+            message.claimed_on = now
+        OutboxMessage.objects.bulk_update(batch, ['claimed_on'])
+    return batch
+
+
+def _flush_batch():
+    batch = _claim_batch()
+    sent, failed = [], []
+    connection = None
+    for message in batch:
+        try:
+            # The connection is checked before the first message, and after a failure.
+            if connection is None:
+                connection = _get_connection()
+            connection.send_messages([message.to_email_message()])
+            message.sent_on = timezone.now()
+            sent.append(message)
+        except Exception as exc:
+            _drop_connection()
+            connection = None
+            # The message keeps its claim, until it expires.
+            message.attempts += 1
+            message.last_error = str(exc)
+            failed.append(message)
+    OutboxMessage.objects.bulk_update(sent, ['sent_on'])
+    OutboxMessage.objects.bulk_update(failed, ['attempts', 'last_error'])
+    return len(batch), len(sent)
+
+
+def flush_outbox():
+    """
+    Sends all the pending messages, in batches. Many workers may flush at once: each batch claims
+      its messages, and skips the ones claimed by others. Each message is attempted at most once
+      per claim, so failed ones are retried every MAIL_OUTBOX_CLAIM_TIMEOUT seconds. Sent messages
+      are kept until they are no longer needed for deduplication, and the ones given up on (after
+      MAIL_OUTBOX_MAX_ATTEMPTS failures) for MAIL_OUTBOX_FAILED_RETENTION seconds.
+    :return: The number of sent messages.
+    """
+
+    total = 0
+    while True:
+        claimed, sent = _flush_batch()
+        total += sent
+        # Stop on a partial batch, or when nothing gets through (e.g. the server is down).
+        if claimed < settings.MAIL_OUTBOX_BATCH_SIZE or not sent:
+            break
+    now = timezone.now()
+    OutboxMessage.objects.purge_sent(now - timedelta(seconds=settings.MAIL_OUTBOX_DEDUP_WINDOW))
+    OutboxMessage.objects.purge_failed(settings.MAIL_OUTBOX_MAX_ATTEMPTS,
+                                       now - timedelta(seconds=settings.MAIL_OUTBOX_FAILED_RETENTION))
+    return total
@@ -0,0 +1,51 @@
+import time
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from ...models import POI
+
+
+class Command(BaseCommand):
+    """
+    Compares the legacy and the index-backed radius searches over the current POI table, and
+      checks that the index-backed plan actually hits the geography GiST index.
+    """
+
+    help = 'Benchmarks POI nearby searches and checks the query plan uses an index scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('longitude', type=float)
+        parser.add_argument('latitude', type=float)
+        parser.add_argument('distance', type=float, help='The search radius, in meters')
+        parser.add_argument('--repeat', type=int, default=10, help='How many times to run each query')
+        parser.add_argument('--no-seqscan', action='store_true',
+                            help='Disable sequential scans, for tables too small to make the planner '
+                                 'prefer the index on its own')
+
+    def _measure(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            count = len(queryset.all())
+        return count, (time.perf_counter() - started) / repeat
+
+    def handle(self, *args, **options):
+        point = Point(options['longitude'], options['latitude'], srid=4326)
+        repeat = max(1, options['repeat'])
+
+        with transaction.atomic():
+            if options['no_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for indexed in (False, True):
+                queryset = POI.objects.nearby_search(point, options['distance'], indexed=indexed)
+                count, elapsed = self._measure(queryset, repeat)
+                self.stdout.write('%s search: %d POIs, %.2f ms per query' % (
+                    'Indexed' if indexed else 'Legacy', count, elapsed * 1000
+                ))
+
+            plan = queryset.explain(analyze=True)
+            self.stdout.write(plan)
+            if 'wtfapi_poi_location_geog_idx' not in plan:
+                raise CommandError('The indexed search did not use the geography index')
+            self.stdout.write(self.style.SUCCESS('The indexed search uses the geography index'))
@@ -0,0 +1,44 @@
+import sys
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from ...exports import WRITERS, filter_pois
+from ...models import POI, Country, Province
+
+
+class Command(BaseCommand):
+    """
+    Streams the (optionally filtered) POIs as a GeoJSON FeatureCollection or as NDJSON.
+    """
+
+    help = 'Exports POIs as GeoJSON or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(WRITERS), default='geojson')
+        parser.add_argument('--output', help='The output file. By default, the standard output')
+        parser.add_argument('--longitude', type=float)
+        parser.add_argument('--latitude', type=float)
+        parser.add_argument('--distance', type=float, help='The search radius, in meters')
+        parser.add_argument('--country', type=int, action='append', default=[])
+        parser.add_argument('--province', type=int, action='append', default=[])
+        parser.add_argument('--category', type=int, action='append', default=[])
+
+    def handle(self, *args, **options):
+        point = None
+        given = [options[key] is not None for key in ('longitude', 'latitude', 'distance')]
+        if any(given):
+            if not all(given):
+                raise CommandError('--longitude, --latitude and --distance must be given together')
+            point = Point(options['longitude'], options['latitude'], srid=4326)
+        regions = None
+        if options['country'] or options['province']:
+            regions = list(Country.objects.filter(id__in=options['country']).only('id'))
+            regions.extend(Province.objects.filter(id__in=options['province']).only('id'))
+
+        queryset = filter_pois(POI.objects.all(), point, options['distance'], regions, options['category'])
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in WRITERS[options['format']](queryset):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
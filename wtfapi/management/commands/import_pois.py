@@ -0,0 +1,60 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from ...imports import READERS, POIImporter
+
+
+class Command(BaseCommand):
+    """
+    Streams a CSV, GeoJSON or NDJSON file into the POI table, in batches. After each committed
+      batch, the number of processed records is saved to a checkpoint file, so an interrupted
+      import can be resumed with --resume.
+    """
+
+    help = 'Bulk imports POIs from a CSV, GeoJSON or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS), help='The file format. By default, it is '
+                                                                      'guessed from the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help='The checkpoint file. By default, the source path plus '
+                                                 '".checkpoint"')
+        parser.add_argument('--resume', action='store_true', help='Skip the records already imported, '
+                                                                  'according to the checkpoint file')
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return json.load(checkpoint)['done']
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, path, done):
+        with open(path + '.tmp', 'w') as checkpoint:
+            json.dump({'done': done}, checkpoint)
+        os.replace(path + '.tmp', path)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format == 'json':
+            file_format = 'geojson'
+        if file_format not in READERS:
+            raise CommandError('Cannot guess the format of %s. Use --format' % path)
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        skip = self._read_checkpoint(checkpoint) if options['resume'] else 0
+
+        def on_batch(done, rate):
+            self._write_checkpoint(checkpoint, done)
+            self.stdout.write('%d records processed (%.0f POIs/s)' % (done, rate))
+
+        importer = POIImporter(max(1, options['batch_size']))
+        if skip:
+            self.stdout.write('Resuming after %d records' % skip)
+        with open(path, newline='', encoding='utf-8') as stream:
+            done = importer.run(READERS[file_format](stream), skip, on_batch)
+
+        if importer.unknown_categories:
+            self.stderr.write('Unknown categories (ignored): %s' % ', '.join(sorted(importer.unknown_categories)))
+        self.stdout.write(self.style.SUCCESS('Done: %d records processed' % done))
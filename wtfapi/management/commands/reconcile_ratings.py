@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from ...models import POI
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized rating aggregates of every POI from the ratings table, in
+      batches of consecutive ids, so each UPDATE stays short.
+    """
+
+    help = 'Recomputes the rating count and sum of every POI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        bounds = POI.all_objects.aggregate(min=Min('id'), max=Max('id'))
+        if bounds['min'] is None:
+            return
+
+        updated = 0
+        for start in range(bounds['min'], bounds['max'] + 1, batch_size):
+            updated += POI.all_objects.filter(id__gte=start, id__lt=start + batch_size).reconcile_ratings()
+            self.stdout.write('%d POIs reconciled' % updated)
+        self.stdout.write(self.style.SUCCESS('Done'))
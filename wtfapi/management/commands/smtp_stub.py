@@ -0,0 +1,83 @@
+import socketserver
+from django.core.management.base import BaseCommand
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP to accept messages (no TLS, no authentication), and hands each
+      received one to the server's `on_message` callback.
+    """
+
+    def _reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def _read_data(self):
+        lines = []
+        for line in self.rfile:
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if line == '.':
+                break
+            # Undo the dot-stuffing.
+            lines.append(line[1:] if line.startswith('..') else line)
+        return '\n'.join(lines)
+
+    def handle(self):
+        sender, recipients = None, []
+        self._reply('220 wtf smtp stub ready')
+        for line in self.rfile:
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self._reply('250 wtf smtp stub')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip())
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.on_message(sender, recipients, self._read_data())
+                sender, recipients = None, []
+                self._reply('250 OK')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self._reply('250 OK')
+            elif verb == 'NOOP':
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class SMTPStubServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    """
+    Runs a local SMTP server which accepts every message and prints it, to test the mail outbox
+      without delivering anything. Point EMAIL_HOST and EMAIL_PORT to it, with EMAIL_USE_TLS off.
+    """
+
+    help = 'Runs a local SMTP stub server that prints the received messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def _on_message(self, sender, recipients, data):
+        self.stdout.write('---------- From %s to %s' % (sender, ', '.join(recipients)))
+        self.stdout.write(data)
+
+    def handle(self, *args, **options):
+        with SMTPStubServer((options['host'], options['port']), SMTPStubHandler) as server:
+            server.on_message = self._on_message
+            self.stdout.write('SMTP stub listening on %s:%d' % (options['host'], options['port']))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
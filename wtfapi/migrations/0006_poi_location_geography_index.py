@@ -0,0 +1,17 @@
+# Generated by Django 2.2.4 on 2026-10-18 10:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0005_auto_20191202_2302'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX wtfapi_poi_location_geog_idx ON wtfapi_poi USING GIST ((location::geography));',
+            reverse_sql='DROP INDEX wtfapi_poi_location_geog_idx;',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.4 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0006_poi_location_geography_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poi',
+            name='countries',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='pois', to='wtfapi.Country', verbose_name='Countries'),
+        ),
+        migrations.AddField(
+            model_name='poi',
+            name='provinces',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='pois', to='wtfapi.Province', verbose_name='Provinces'),
+        ),
+        migrations.RunSQL(
+            sql=[
+                'INSERT INTO wtfapi_poi_countries (poi_id, country_id) '
+                'SELECT p.id, r.id FROM wtfapi_poi p JOIN wtfapi_country r ON ST_Intersects(r.boundaries, p.location);',
+                'INSERT INTO wtfapi_poi_provinces (poi_id, province_id) '
+                'SELECT p.id, r.id FROM wtfapi_poi p JOIN wtfapi_province r ON ST_Intersects(r.boundaries, p.location);',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.4 on 2026-10-18 12:27
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0007_poi_region_membership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryPiece',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('boundaries', django.contrib.gis.db.models.fields.GeometryField(srid=4326)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pieces', to='wtfapi.Country')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProvincePiece',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('boundaries', django.contrib.gis.db.models.fields.GeometryField(srid=4326)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pieces', to='wtfapi.Province')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunSQL(
+            sql=[
+                'INSERT INTO wtfapi_countrypiece (region_id, boundaries) '
+                'SELECT id, ST_Subdivide(boundaries, 256) FROM wtfapi_country;',
+                'INSERT INTO wtfapi_provincepiece (region_id, boundaries) '
+                'SELECT id, ST_Subdivide(boundaries, 256) FROM wtfapi_province;',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
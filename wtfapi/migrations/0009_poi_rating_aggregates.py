@@ -0,0 +1,29 @@
+# Generated by Django 2.2.4 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0008_region_pieces'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poi',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Rating Count'),
+        ),
+        migrations.AddField(
+            model_name='poi',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Rating Sum'),
+        ),
+        migrations.RunSQL(
+            sql='UPDATE wtfapi_poi p SET rating_count = r.count, rating_sum = r.sum '
+                'FROM (SELECT poi_id, COUNT(*) AS count, SUM(score) AS sum FROM wtfapi_rating GROUP BY poi_id) r '
+                'WHERE r.poi_id = p.id;',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
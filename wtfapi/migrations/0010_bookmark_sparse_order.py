@@ -0,0 +1,34 @@
+# Generated by Django 2.2.4 on 2026-10-18 16:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wtfapi', '0009_poi_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='bookmark',
+            unique_together={('user', 'poi')},
+        ),
+        migrations.AlterField(
+            model_name='bookmark',
+            name='order',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', 'order'], name='wtfapi_bookmark_user_order'),
+        ),
+        migrations.RunSQL(
+            sql='UPDATE wtfapi_bookmark SET "order" = "order" * 65536;',
+            reverse_sql='UPDATE wtfapi_bookmark b SET "order" = r.position FROM ('
+                        'SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY "order", id) AS position '
+                        'FROM wtfapi_bookmark) r WHERE r.id = b.id;',
+        ),
+    ]
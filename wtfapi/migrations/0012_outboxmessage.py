@@ -0,0 +1,39 @@
+# Generated by Django 2.2.4 on 2026-10-18 17:40
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0011_authtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('sent_on', models.DateTimeField(blank=True, null=True)),
+                ('dedup_key', models.CharField(blank=True, max_length=100, null=True)),
+                ('from_email', models.CharField(blank=True, max_length=254, null=True)),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('recipients', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('headers', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('alternatives', django.contrib.postgres.fields.jsonb.JSONField(default=list)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(condition=models.Q(sent_on__isnull=True), fields=['created_on'], name='wtfapi_outbox_pending'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['dedup_key', 'created_on'], name='wtfapi_outbox_dedup'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.4 on 2026-10-18 18:30
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+ALIVE = 'deleted = false AND deleted_by_id IS NULL'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0012_outboxmessage'),
+    ]
+
+    operations = [
+        # The PostGIS schema editor ignores index conditions on spatial fields, so the partial
+        # GiST indexes are created by hand.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='poi',
+                    name='location',
+                    field=django.contrib.gis.db.models.fields.PointField(spatial_index=False, srid=4326,
+                                                                        verbose_name='Location'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql=['DROP INDEX wtfapi_poi_location_id;',
+                         'CREATE INDEX wtfapi_poi_location_alive ON wtfapi_poi USING GIST (location) '
+                         'WHERE %s;' % ALIVE],
+                    reverse_sql=['DROP INDEX wtfapi_poi_location_alive;',
+                                 'CREATE INDEX wtfapi_poi_location_id ON wtfapi_poi USING GIST (location);'],
+                ),
+            ],
+        ),
+        migrations.RunSQL(
+            sql=['DROP INDEX wtfapi_poi_location_geog_idx;',
+                 'CREATE INDEX wtfapi_poi_location_geog_idx ON wtfapi_poi USING GIST ((location::geography)) '
+                 'WHERE %s;' % ALIVE],
+            reverse_sql=['DROP INDEX wtfapi_poi_location_geog_idx;',
+                         'CREATE INDEX wtfapi_poi_location_geog_idx ON wtfapi_poi USING GIST '
+                         '((location::geography));'],
+        ),
+        migrations.AddIndex(
+            model_name='poi',
+            index=models.Index(condition=models.Q(deleted=False, deleted_by__isnull=True), fields=['id'],
+                               name='wtfapi_poi_alive_id'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(condition=models.Q(deleted=False, deleted_by__isnull=True), fields=['name'],
+                               name='wtfapi_country_alive_name'),
+        ),
+        migrations.AddIndex(
+            model_name='province',
+            index=models.Index(condition=models.Q(deleted=False, deleted_by__isnull=True), fields=['name'],
+                               name='wtfapi_province_alive_name'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.4 on 2026-10-18 19:05
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0013_soft_deleted_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('archived_on', models.DateTimeField(auto_now_add=True)),
+                ('model', models.CharField(max_length=100)),
+                ('record_id', models.BigIntegerField()),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['model', 'record_id'], name='wtfapi_archive_record'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.4 on 2026-10-18 19:50
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0014_archivedrecord'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Backs the admin name search (UPPER(name::text) LIKE UPPER('%...%')) on the live POIs.
+        migrations.RunSQL(
+            sql='CREATE INDEX wtfapi_poi_name_upper_trgm ON wtfapi_poi USING GIN (UPPER(name::text) gin_trgm_ops) '
+                'WHERE deleted = false AND deleted_by_id IS NULL;',
+            reverse_sql='DROP INDEX wtfapi_poi_name_upper_trgm;',
+        ),
+    ]
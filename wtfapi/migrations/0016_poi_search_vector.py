@@ -0,0 +1,50 @@
+# Generated by Django 2.2.4 on 2026-10-18 20:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+# Must use the same configuration as wtfapi.models.text.SEARCH_CONFIG.
+VECTOR = "setweight(to_tsvector('simple', coalesce({row}name, '')), 'A') || " \
+         "setweight(to_tsvector('simple', coalesce({row}description, '')), 'B')"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0015_poi_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poi',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # The search vector is recomputed on every insert and on every update of the name or the
+        # description (the rating updates do not touch it).
+        migrations.RunSQL(
+            sql=['CREATE FUNCTION wtfapi_poi_search_vector_update() RETURNS trigger AS $$ '
+                 'BEGIN NEW.search_vector := %s; RETURN NEW; END $$ LANGUAGE plpgsql;' % VECTOR.format(row='NEW.'),
+                 'CREATE TRIGGER wtfapi_poi_search_vector_update BEFORE INSERT OR UPDATE OF name, description '
+                 'ON wtfapi_poi FOR EACH ROW EXECUTE PROCEDURE wtfapi_poi_search_vector_update();'],
+            reverse_sql=['DROP TRIGGER wtfapi_poi_search_vector_update ON wtfapi_poi;',
+                         'DROP FUNCTION wtfapi_poi_search_vector_update();'],
+        ),
+        migrations.RunSQL(
+            sql='UPDATE wtfapi_poi SET search_vector = %s;' % VECTOR.format(row=''),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='poi',
+            index=django.contrib.postgres.indexes.GinIndex(condition=models.Q(deleted=False, deleted_by__isnull=True),
+                                                           fields=['search_vector'], name='wtfapi_poi_alive_search'),
+        ),
+        migrations.AddIndex(
+            model_name='poi',
+            index=django.contrib.postgres.indexes.GinIndex(condition=models.Q(deleted=False, deleted_by__isnull=True),
+                                                           fields=['name'], name='wtfapi_poi_alive_name_trgm',
+                                                           opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.4 on 2026-10-18 21:30
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0016_poi_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='claimed_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='attachments',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=list),
+        ),
+        # Pending duplicates (queued concurrently) keep being sent, but only the oldest one keeps
+        # its key, so the unique constraint below can be created.
+        migrations.RunSQL(
+            sql='UPDATE wtfapi_outboxmessage SET dedup_key = NULL WHERE sent_on IS NULL AND dedup_key IS NOT NULL '
+                'AND id NOT IN (SELECT MIN(id) FROM wtfapi_outboxmessage WHERE sent_on IS NULL '
+                'AND dedup_key IS NOT NULL GROUP BY dedup_key);',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='outboxmessage',
+            constraint=models.UniqueConstraint(condition=models.Q(sent_on__isnull=True), fields=('dedup_key',),
+                                               name='wtfapi_outbox_pending_dedup'),
+        ),
+    ]
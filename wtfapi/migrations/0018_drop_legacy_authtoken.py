@@ -0,0 +1,19 @@
+# Generated by Django 2.2.4 on 2026-10-18 22:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wtfapi', '0017_outbox_claims_attachments'),
+    ]
+
+    operations = [
+        # rest_framework.authtoken is no longer installed (see AuthToken), but its table would
+        # keep holding the plaintext keys of the former tokens.
+        migrations.RunSQL(
+            sql='DROP TABLE IF EXISTS authtoken_token;',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
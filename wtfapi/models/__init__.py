@@ -1,3 +1,6 @@
 from .poi import POI
 from .user import User, Rating, Bookmark
-from .regions import Province, Country
+from .regions import Province, Country, ProvincePiece, CountryPiece
+from .tokens import AuthToken
+from .mail import OutboxMessage
+from .archive import ArchivedRecord
@@ -0,0 +1,25 @@
+"""
+The archive of purged records. Soft-deleted records (and the records depending on them) are
+  eventually moved here by `wtfapi.archival`, so they stop weighing on the hot tables and their
+  indexes, while still being recoverable by hand.
+"""
+
+
+from django.contrib.postgres.fields import JSONField
+from django.db import models
+
+
+class ArchivedRecord(models.Model):
+    """
+    An archived record, as the JSON of its whole row.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    archived_on = models.DateTimeField(auto_now_add=True)
+    # The model label (e.g. wtfapi.poi) and the primary key the record had.
+    model = models.CharField(max_length=100)
+    record_id = models.BigIntegerField()
+    data = JSONField()
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'record_id'], name='wtfapi_archive_record')]
@@ -5,21 +5,44 @@ BUT I did not port it to Python 3 yet, and the former namespace format have a bu
 """
 
 
+from copy import copy
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 
+# The condition of the non-deleted records. If at least one of the two fields is set, the record
+#   counts as deleted. Partial indexes (see the models' Meta) use this same condition, so queries
+#   filtering by it never read deleted rows from those indexes.
+ALIVE = models.Q(deleted=False, deleted_by__isnull=True)
+
+
 class SoftDeletedQueryset(models.QuerySet):
 
-    def all(self):
+    def alive(self):
         """
         Excludes the marked-as-deleted records.
-        :return: A base queryset, excluding the deleted ones.
+        :return: A new queryset, excluding the deleted ones.
+        """
+
+        return self.filter(ALIVE)
+
+    def dead(self):
+        """
+        Keeps only the marked-as-deleted records.
+        :return: A new queryset, with only the deleted ones.
         """
 
-        # If at least one of the two fields is null, it will count
-        #   as deleted and not included in the regular queryset.
-        return self.filter(deleted=False, deleted_by__isnull=True)
+        return self.exclude(ALIVE)
+
+
+class SoftDeletedManager(models.Manager):
+    """
+    Default manager of soft-deleted records: every query starts from the non-deleted ones. Use
+      the `all_objects` manager to also reach the deleted ones (e.g. for maintenance).
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().alive()
 
 
 class SoftDeleted(models.Model):
@@ -35,6 +58,9 @@ class SoftDeleted(models.Model):
     deleted = models.BooleanField(default=False, editable=False)
     deleted_by = models.ForeignKey('User', editable=False, null=True, on_delete=models.SET_NULL)
 
+    objects = SoftDeletedManager.from_queryset(SoftDeletedQueryset)()
+    all_objects = SoftDeletedQueryset.as_manager()
+
     class Meta:
         abstract = True
 
@@ -56,3 +82,50 @@ class Described(SoftDeleted):
 
     class Meta:
         abstract = True
+
+
+class FieldTracked(models.Model):
+    """
+    Remembers the values some fields had when the record was loaded, so expensive derived
+      data (e.g. region membership) is only recomputed when those fields actually change.
+    """
+
+    tracked_fields = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {name: copy(getattr(self, name)) for name in self.tracked_fields
+                               if name not in deferred}
+
+    def has_changed(self, name):
+        """
+        Tells whether a tracked field changed since the record was loaded or last saved.
+          New records count as changed.
+        :param name: The field name.
+        :return: Whether it changed.
+        """
+
+        loaded = getattr(self, '_loaded_values', None)
+        return loaded is None or name not in loaded or loaded[name] != getattr(self, name)
+
+    def loaded_value(self, name):
+        """
+        Gets the value a tracked field had when the record was loaded or last saved.
+        :param name: The field name.
+        :return: The value, or None if not known (e.g. new records).
+        """
+
+        return getattr(self, '_loaded_values', {}).get(name)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields()
@@ -0,0 +1,146 @@
+"""
+The mail outbox: e-mail messages are queued in this table (see `wtfapi.mail.OutboxEmailBackend`)
+  and sent periodically, in batches, by a celery task which reuses its SMTP connection.
+"""
+
+
+from base64 import b64encode, b64decode
+from datetime import timedelta
+from django.contrib.postgres.fields import JSONField
+from django.core.mail import EmailMultiAlternatives
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class OutboxMessageQuerySet(models.QuerySet):
+    """
+    Queries and maintenance on queued e-mail messages.
+    """
+
+    def pending(self):
+        return self.filter(sent_on__isnull=True)
+
+    def claimable(self, max_attempts, claim_timeout):
+        """
+        Filters the pending messages which may be sent: the ones not given up on, and either not
+          claimed by a sender or claimed too long ago (i.e. by a sender that died meanwhile, or
+          that failed to send them and left them to be retried later).
+        :param max_attempts: How many failed attempts a message is given up after.
+        :param claim_timeout: How long (in seconds) a claim lasts.
+        """
+
+        expired = timezone.now() - timedelta(seconds=claim_timeout)
+        return self.pending().filter(Q(claimed_on__isnull=True) | Q(claimed_on__lt=expired),
+                                     attempts__lt=max_attempts)
+
+    def enqueue(self, messages, dedup_window):
+        """
+        Queues e-mail messages. Messages having a `dedup_key` attribute are skipped if another one
+          with the same key was queued within the deduplication window, or is still pending (this
+          last check is enforced by a unique index, so concurrent requests queue just one).
+        :param messages: The `EmailMessage` objects to queue. They must be storable (see
+          `OutboxMessage.is_storable`).
+        :param dedup_window: The deduplication window, in seconds.
+        :return: The number of messages given to queue.
+        """
+
+        since = timezone.now() - timedelta(seconds=dedup_window)
+        keys = {message.dedup_key for message in messages if getattr(message, 'dedup_key', None)}
+        seen = set(self.filter(dedup_key__in=keys, created_on__gte=since).values_list('dedup_key', flat=True)) \
+            if keys else set()
+        queued = []
+        for message in messages:
+            key = getattr(message, 'dedup_key', None)
+            if key in seen:
+                continue
+            if key:
+                seen.add(key)
+            queued.append(OutboxMessage.from_email_message(message, key))
+        self.bulk_create(queued, ignore_conflicts=True)
+        return len(queued)
+
+    def purge_sent(self, before):
+        """
+        Deletes the messages sent before a given time.
+        """
+
+        return self.filter(sent_on__lt=before).delete()[0]
+
+    def purge_failed(self, max_attempts, before):
+        """
+        Deletes the messages given up on (after many failed attempts), queued before a given time.
+        """
+
+        return self.pending().filter(attempts__gte=max_attempts, created_on__lt=before).delete()[0]
+
+
+class OutboxMessage(models.Model):
+    """
+    A queued e-mail message, and its delivery status.
+    """
+
+    # Timestamp fields. A message is claimed by a sender before being sent, so no other sender
+    #   takes it meanwhile.
+    created_on = models.DateTimeField(auto_now_add=True)
+    claimed_on = models.DateTimeField(null=True, blank=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+    # Deduplication key: a message is not queued if another one was, within a time window, with
+    # the same key (e.g. many password reset requests for the same user), or is still pending.
+    dedup_key = models.CharField(max_length=100, null=True, blank=True)
+    # The message itself.
+    from_email = models.CharField(max_length=254, null=True, blank=True)
+    subject = models.TextField()
+    body = models.TextField()
+    recipients = JSONField(default=dict)
+    headers = JSONField(default=dict)
+    alternatives = JSONField(default=list)
+    # (filename, base64 content, mimetype) triples.
+    attachments = JSONField(default=list)
+    # Delivery failures.
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    objects = OutboxMessageQuerySet.as_manager()
+
+    @staticmethod
+    def is_storable(message):
+        """
+        Tells whether an e-mail message can be stored in the outbox. Only the attachments given
+          as (filename, content, mimetype) triples can: not the already built MIME parts.
+        """
+
+        return all(isinstance(attachment, tuple) for attachment in message.attachments)
+
+    @classmethod
+    def from_email_message(cls, message, dedup_key=None):
+        attachments = []
+        for filename, content, mimetype in message.attachments:
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            attachments.append([filename, b64encode(content).decode('ascii'), mimetype])
+        return cls(dedup_key=dedup_key, from_email=message.from_email, subject=message.subject, body=message.body,
+                   recipients={'to': message.to, 'cc': message.cc, 'bcc': message.bcc,
+                               'reply_to': message.reply_to},
+                   headers=message.extra_headers, alternatives=getattr(message, 'alternatives', []),
+                   attachments=attachments)
+
+    def to_email_message(self, connection=None):
+        message = EmailMultiAlternatives(self.subject, self.body, self.from_email, self.recipients.get('to'),
+                                         self.recipients.get('bcc'), connection,
+                                         alternatives=[tuple(alternative) for alternative in self.alternatives],
+                                         cc=self.recipients.get('cc'), reply_to=self.recipients.get('reply_to'),
+                                         headers=self.headers)
+        for filename, content, mimetype in self.attachments:
+            # Text attachments are decoded back by `attach`, given their mimetype.
+            message.attach(filename, b64decode(content), mimetype)
+        return message
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_on'], name='wtfapi_outbox_pending', condition=Q(sent_on__isnull=True)),
+            models.Index(fields=['dedup_key', 'created_on'], name='wtfapi_outbox_dedup'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedup_key'], name='wtfapi_outbox_pending_dedup',
+                                    condition=Q(sent_on__isnull=True)),
+        ]
@@ -5,24 +5,67 @@ Points of interest are the stuff we search for. This means: we use some kind of
 
 
 from functools import reduce
-from django.db import models
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.db.models import PointField
+from math import ceil, log, tan, pi, radians
+from django.db import models, connection
+from django.contrib.gis.db.models.functions import Distance, Transform, SnapToGrid, Centroid
+from django.contrib.gis.db.models import PointField, Collect
+from django.contrib.gis.geos import Polygon
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField, SearchQuery, SearchRank
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils.translation import ugettext_lazy as _
 from category.models import Category
-from .base import SoftDeletedQueryset, Described
+from ..categories import category_tree
+from .base import ALIVE, SoftDeletedQueryset, SoftDeletedManager, Described, FieldTracked
+from .regions import Country, Province
+from .user import Rating
+from .spatial import GeographyKNNDistance, GEOGRAPHY_SRID, MERCATOR_SRID, MERCATOR_HALF_SIZE
+from .text import SEARCH_CONFIG, TrigramWordSimilarity
+
+
+def cluster_cell_size(zoom, cell_pixels=32):
+    """
+    The side, in web mercator meters, of the grid cells POIs are clustered in (see `clusters`).
+    """
+
+    return 2 * MERCATOR_HALF_SIZE / (256 << zoom) * cell_pixels
+
+
+def count_cluster_cells(bbox, zoom, cell_pixels=32):
+    """
+    Tells how many grid cells (i.e. clusters, at most) a bounding box spans at a zoom level.
+    :param bbox: The (west, south, east, north) bounding box, in degrees.
+    :param zoom: The zoom level.
+    :param cell_pixels: The size of each grid cell, in pixels (of 256px tiles).
+    :return: The number of cells.
+    """
+
+    def _mercator_y(latitude):
+        latitude = max(-85.0511, min(85.0511, latitude))
+        return log(tan(pi / 4 + radians(latitude) / 2)) / pi * MERCATOR_HALF_SIZE
+
+    west, south, east, north = bbox
+    cell = cluster_cell_size(zoom, cell_pixels)
+    columns = ceil((east - west) / 360 * 2 * MERCATOR_HALF_SIZE / cell) + 1
+    rows = ceil((_mercator_y(north) - _mercator_y(south)) / cell) + 1
+    return columns * rows
 
 
 class POIQuerySet(SoftDeletedQueryset):
 
-    def within(self, point, distance):
+    def within(self, point, distance, indexed=True):
         """
         Returns all the POIs within a given radius.
         :param point: The center point.
         :param distance: The radius, in meters.
+        :param indexed: Whether to search by ST_DWithin over the geography-cast location (which uses
+          the GiST index as a bounding box prefilter and then refines by exact distance) or by the
+          legacy, per-row distance computation.
         :return: A new queryset for that condition.
         """
 
+        if indexed:
+            return self.filter(location__geography_dwithin=(point, distance))
         return self.filter(location__distance_lte=(point, distance))
 
     def annotate_distances(self, **points):
@@ -36,7 +79,7 @@ class POIQuerySet(SoftDeletedQueryset):
 
         return self.annotate(**{k: Distance('location', v) for k, v in points.items()})
 
-    def nearby_search(self, point, distance, output_field='distance'):
+    def nearby_search(self, point, distance, output_field='distance', indexed=True):
         """
         Returns a queryset filtering by a required distance from a point, and also
           ordering by such distance.
@@ -44,25 +87,310 @@ class POIQuerySet(SoftDeletedQueryset):
         :param distance: The radius, in meters.
         :param output_field: The output field name, which will be the field to hold
           the distance and order by it. The field must NOT exist. By default, 'distance'.
+        :param indexed: Whether to use the index-backed radius filter. See `within`.
         :return: A new queryset, with the filter & sort criteria.
         """
 
-        return self.within(point, distance).annotate_distances(**{output_field: point}).order_by(output_field)
+        return self.within(point, distance, indexed).annotate_distances(**{output_field: point}).order_by(output_field)
+
+    def nearest(self, point, k, max_distance=None, output_field='distance'):
+        """
+        Returns the k POIs closest to a point, ordered by their distance. The ordering is
+          resolved by a KNN walk on the location index, so the cost depends on k and not
+          on how many POIs lie around the point.
+        :param point: The reference point.
+        :param k: How many POIs to retrieve, at most.
+        :param max_distance: An optional radius, in meters, to also bound the search.
+        :param output_field: The output field name, which will be the field to hold
+          the distance (in meters) and order by it. The field must NOT exist.
+        :return: A new, sliced, queryset.
+        """
+
+        queryset = self if max_distance is None else self.within(point, max_distance)
+        return queryset.annotate(**{output_field: GeographyKNNDistance('location', point)}).order_by(output_field)[:k]
+
+    def clusters(self, bbox, zoom, cell_pixels=32, srid=GEOGRAPHY_SRID):
+        """
+        Aggregates the POIs inside a bounding box into a grid of clusters, suited to render a map
+          at a given zoom level. The grid is aligned to the web mercator tiles of that level: each
+          cell lies in a single tile, and each POI is snapped to the center of the cell it lies in.
+        :param bbox: The (west, south, east, north) bounding box, in degrees.
+        :param zoom: The zoom level.
+        :param cell_pixels: The size of each grid cell, in pixels (of 256px tiles).
+        :param srid: The SRID of the returned centroids.
+        :return: A values queryset, with the `count` of POIs and the `centroid` of each grid `cell`.
+          Annotate it before narrowing it with values(), or the grouping will be lost. There are
+          up to `count_cluster_cells` of them: bound it for user-given boxes.
+        """
+
+        bbox = Polygon.from_bbox(bbox)
+        bbox.srid = GEOGRAPHY_SRID
+        location = Transform('location', MERCATOR_SRID)
+        centroid = Centroid(Collect(location))
+        if srid != MERCATOR_SRID:
+            centroid = Transform(centroid, srid)
+        cell = cluster_cell_size(zoom, cell_pixels)
+        # Snapping to the nearest point of a grid shifted by half a cell: the cell centers.
+        snapped = SnapToGrid(location, cell, cell, cell / 2, cell / 2)
+        return self.filter(location__bboverlaps=bbox).annotate(cell=snapped).values('cell').annotate(
+            count=models.Count('id'), centroid=centroid
+        )
+
+    def annotate_rating_average(self, output_field='rating_average'):
+        """
+        Annotates the average score of each POI, from its denormalized rating aggregates.
+        :param output_field: The output field name. The field must NOT exist.
+        :return: A new queryset with the average (or None, for unrated POIs) annotated.
+        """
+
+        return self.annotate(**{output_field: models.ExpressionWrapper(
+            models.F('rating_sum') * 1.0 / NullIf(models.F('rating_count'), 0), output_field=models.FloatField()
+        )})
+
+    def update_ratings(self, count_delta, sum_delta):
+        """
+        Atomically adds deltas to the rating aggregates of the POIs in this queryset.
+        :param count_delta: The delta to add to the rating count.
+        :param sum_delta: The delta to add to the rating sum.
+        :return: The number of updated POIs.
+        """
+
+        return self.update(rating_count=models.F('rating_count') + count_delta,
+                           rating_sum=models.F('rating_sum') + sum_delta)
+
+    def apply_rating_deltas(self, deltas):
+        """
+        Atomically adds per-POI deltas to the rating aggregates, in a single UPDATE.
+        :param deltas: A dictionary of POI id => (count delta, sum delta).
+        """
+
+        if not deltas:
+            return
+        values = ', '.join(['(%s, %s, %s)'] * len(deltas))
+        params = [value for poi_id, (count, total) in deltas.items() for value in (poi_id, count, total)]
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE {pois} p SET rating_count = p.rating_count + d.count, '
+                           'rating_sum = p.rating_sum + d.sum FROM (VALUES {values}) AS d(id, count, sum) '
+                           'WHERE p.id = d.id'.format(pois=self.model._meta.db_table, values=values), params)
+
+    def reconcile_ratings(self):
+        """
+        Recomputes, from the ratings table, the rating aggregates of the POIs in this queryset.
+        :return: The number of updated POIs.
+        """
+
+        ratings = Rating.objects.filter(poi=models.OuterRef('pk')).order_by().values('poi')
+        return self.update(
+            rating_count=Coalesce(models.Subquery(ratings.annotate(count=models.Count('id')).values('count'),
+                                                  output_field=models.IntegerField()), 0),
+            rating_sum=Coalesce(models.Subquery(ratings.annotate(sum=models.Sum('score')).values('sum'),
+                                                output_field=models.IntegerField()), 0)
+        )
+
+    def in_categories(self, categories, include_descendants=True):
+        """
+        Returns a queryset filtering all the points by one or more categories. Accepted points
+          will be the ones linked to any of the specified categories (or, by default, to any of
+          their descendants). The descendants come from the cached category tree, so this is
+          a single semi-join with an IN list on the POI/category link table.
+        :param categories: An iterable with categories (or category ids) to search by.
+        :param include_descendants: Whether to also accept POIs in the descendant categories.
+        :return: A new queryset for that condition.
+        """
+
+        if include_descendants:
+            category_ids = category_tree.descendants(categories)
+        else:
+            category_ids = {category.pk if isinstance(category, Category) else category for category in categories}
+        if not category_ids:
+            return self.none()
+
+        through = self.model.categories.through
+        return self.filter(id__in=through.objects.filter(category_id__in=sorted(category_ids)).values('poi_id'))
 
     def in_region(self, regions):
         """
         Returns a queryset filtering all the points by one or more required regions (with certain geometry).
         Accepted/returned points will be the ones that belong to one or more of the specified regions. For
           an intersection criterion, several chained calls to this method will do the trick.
+        Membership is read from the precomputed POI/region tables, so this is an integer semi-join
+          instead of a geometry intersection against each region's boundaries.
         :param regions: An iterable with regions to search by.
         :return: A new queryset for that condition.
         """
 
-        return self.filter(reduce(lambda a, b: a | b, (models.Q(location__intersects=region.boundaries)
-                                                       for region in regions if region.boundaries)))
+        ids_by_model = {}
+        for region in regions:
+            ids_by_model.setdefault(type(region), []).append(region.pk)
+        if not ids_by_model:
+            return self.none()
+
+        return self.filter(reduce(lambda a, b: a | b, (
+            models.Q(id__in=model.pois.through.objects.filter(**{model._meta.model_name + '_id__in': ids})
+                                                      .values('poi_id'))
+            for model, ids in ids_by_model.items()
+        )))
+
+    def allowed_for(self, user, country_ids=None, province_ids=None):
+        """
+        Returns the POIs that can be managed by a user: the ones lying in the countries or
+          provinces the user may manage (provided they have also the permission to manage them at
+          admin level). Membership is read from the precomputed POI/region tables.
+        :param user: The user.
+        :param country_ids: The ids of the countries the user may manage, if already known (e.g.
+          cached). Otherwise, they are resolved by a subquery.
+        :param province_ids: The ids of the provinces the user may manage, if already known.
+        :return: A new queryset for that condition.
+        """
+
+        if user.is_superuser:
+            return self
+        if country_ids is None:
+            country_ids = Country.objects.allowed_for(user).values('id')
+        if province_ids is None:
+            province_ids = Province.objects.allowed_for(user).values('id')
+        return self.filter(
+            models.Q(id__in=Country.pois.through.objects.filter(country_id__in=country_ids).values('poi_id')) |
+            models.Q(id__in=Province.pois.through.objects.filter(province_id__in=province_ids).values('poi_id'))
+        )
+
+    @staticmethod
+    def keyset_condition(fields, after):
+        """
+        Builds the condition of the rows coming after a key, in the order given by some fields
+          (see `keyset`): (f1, f2, ..., fn) > (a1, a2, ..., an), spelled out so it works on
+          annotations (and mixed directions) too.
+        :param fields: The (field or annotation) names, prefixed by '-' when descending.
+        :param after: The key (values of those fields).
+        :return: A Q object.
+        """
+
+        def _beyond(field, value):
+            if field.startswith('-'):
+                return models.Q(**{field[1:] + '__lt': value})
+            return models.Q(**{field + '__gt': value})
 
+        condition = _beyond(fields[-1], after[-1])
+        for field, value in reversed(list(zip(fields[:-1], after[:-1]))):
+            condition = _beyond(field, value) | (models.Q(**{field.lstrip('-'): value}) & condition)
+        return condition
 
-class POI(Described):
+    def keyset(self, fields, after=None, limit=50):
+        """
+        Returns a page of a queryset, by keyset pagination: rows are ordered by the given fields
+          (ascending, or descending for the ones prefixed by '-'), and the page starts right after
+          a given key. Unlike OFFSET, skipped rows are never computed (nor discarded), so every
+          page costs the same.
+        :param fields: The (field or annotation) names to order by. They must make a unique key
+          (e.g. end with 'id').
+        :param after: The key (values of those fields) of the last row of the previous page, if any.
+        :param limit: The page size.
+        :return: A new, sliced, queryset.
+        """
+
+        queryset = self
+        if after is not None:
+            queryset = queryset.filter(self.keyset_condition(fields, after))
+        return queryset.order_by(*fields)[:limit]
+
+    def text_search(self, text, output_field='rank', fuzzy=True):
+        """
+        Returns the POIs matching a text, ordered by relevance (and id). A POI matches when its
+          name or description contain all the words of the text (by the maintained search vector
+          and its GIN index), or, if fuzzy, when its name has a word similar to the text (by the
+          trigram GIN index on the name), so typos are tolerated. Both conditions are index-backed,
+          and the planner just ORs both bitmaps.
+        This method can be combined with the other ones (e.g. `nearby_search`, or `keyset`). Any
+          ordering already applied (e.g. by distance) is kept, and the relevance just breaks its
+          ties. As usual, orderings applied afterwards replace this one.
+        :param text: The text to search, as typed by the user.
+        :param output_field: The output field name, which will hold the relevance of each POI: the
+          full text rank (names weight more than descriptions) plus, if fuzzy, the trigram word
+          similarity of the name. The field must NOT exist.
+        :param fuzzy: Whether to also match (and rank) names by trigram similarity.
+        :return: A new queryset, with the filter & (extra) sort criteria.
+        """
+
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        condition = models.Q(search_vector=query)
+        rank = SearchRank(models.F('search_vector'), query)
+        if fuzzy:
+            condition |= models.Q(name__trigram_word_similar=text)
+            rank = rank + TrigramWordSimilarity(text, 'name')
+        # Ranks are computed as reals, but kept as double precision: otherwise, cursors (which hold
+        #   them as doubles) would never equal them again, and ties at page boundaries would be lost.
+        queryset = self.filter(condition).annotate(**{output_field: Cast(rank, models.FloatField())})
+        return queryset.order_by(*queryset.query.order_by, '-' + output_field, 'id')
+
+    def search(self, point=None, distance=None, regions=None, categories=None, after=None, limit=50,
+               output_field='distance', text=None, rank_field='rank'):
+        """
+        Combined POI search, in a single query: every filter is either an index-backed radius
+          filter or an integer semi-join (on the precomputed region membership, and on the
+          category links with the descendants already expanded), so the planner can start with
+          whichever is most selective and evaluate the others as cheap, index-backed checks.
+        Results are paged by keyset (see `keyset`): ordered by distance (resolved by a KNN walk
+          on the location index) and id or, with no point, by relevance and id when searching a
+          text, and just by id otherwise. Text searches are index-backed too (see `text_search`),
+          so "pizza near me" is still a single query.
+        :param point: The reference point, if any.
+        :param distance: An optional radius, in meters, around the point.
+        :param regions: The regions (countries or provinces) to search in, if any.
+        :param categories: The categories (or category ids) to search in, if any.
+        :param after: The key of the last POI of the previous page, if any: (distance, id) when
+          searching around a point, (rank, id) when searching a text without a point, and (id,)
+          otherwise.
+        :param limit: The page size.
+        :param output_field: The output field name, which will hold the distance (in meters) of
+          each POI when a point is given. The field must NOT exist.
+        :param text: The text to search, if any.
+        :param rank_field: The output field name, which will hold the relevance of each POI when
+          a text is given. The field must NOT exist.
+        :return: A new, sliced, queryset.
+        """
+
+        queryset = self
+        if regions is not None:
+            queryset = queryset.in_region(regions)
+        if categories:
+            queryset = queryset.in_categories(categories)
+        if text:
+            queryset = queryset.text_search(text, rank_field)
+        # The page ordering is always set last, by `keyset`, whatever the filters ordered by.
+        if point is None:
+            return queryset.keyset(('-' + rank_field, 'id') if text else ('id',), after, limit)
+
+        if distance is not None:
+            queryset = queryset.within(point, distance)
+        queryset = queryset.annotate(**{output_field: GeographyKNNDistance('location', point)})
+        return queryset.keyset((output_field, 'id'), after, limit)
+
+    def refresh_regions(self):
+        """
+        Recomputes, in bulk, the country and province membership of the POIs in this queryset.
+          Useful after bulk operations, which do not trigger the per-record refresh. Only live
+          POIs are members of regions: the deleted ones just lose their membership.
+        """
+
+        ids_sql, ids_params = self.order_by().values('id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            for model in (Country, Province):
+                through = model.pois.through._meta.db_table
+                region_column = model._meta.model_name + '_id'
+                cursor.execute('DELETE FROM {through} WHERE poi_id IN ({ids})'.format(
+                    through=through, ids=ids_sql
+                ), ids_params)
+                cursor.execute('INSERT INTO {through} (poi_id, {column}) '
+                               'SELECT DISTINCT p.id, r.region_id FROM {pois} p JOIN {pieces} r '
+                               'ON ST_Intersects(r.boundaries, p.location) WHERE p.id IN ({ids}) '
+                               'AND p.deleted = false AND p.deleted_by_id IS NULL'.format(
+                                   through=through, column=region_column, pois=self.model._meta.db_table,
+                                   pieces=model._meta.get_field('pieces').related_model._meta.db_table,
+                                   ids=ids_sql
+                               ), ids_params)
+
+
+class POI(Described, FieldTracked):
     """
     POIs are the core of this system. They are literally points
       of interest, and will have name, image and description (Other
@@ -72,10 +400,25 @@ class POI(Described):
     # Image is optional for a POI, but adds some description.
     picture = models.ImageField(upload_to='pictures', blank=True, null=True, verbose_name=_('Picture'))
     # Filtering data (by category or location).
-    location = PointField(verbose_name=_('Location'))
+    location = PointField(spatial_index=False, verbose_name=_('Location'))
     categories = models.ManyToManyField(Category, blank=True, verbose_name=_('Categories'))
+    # Regions this POI lies in. They are derived from the location, and kept up to date on save.
+    countries = models.ManyToManyField(Country, blank=True, editable=False, related_name='pois',
+                                       verbose_name=_('Countries'))
+    provinces = models.ManyToManyField(Province, blank=True, editable=False, related_name='pois',
+                                       verbose_name=_('Provinces'))
+    # Rating aggregates. They are kept up to date by `User.rate` and `User.unrate`.
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Rating Count'))
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Rating Sum'))
+    # Weighted search vector of the name (A) and description (B). It is kept up to date by a database
+    #   trigger (see the migrations), so it is computed on every insert or update, even bulk ones.
+    search_vector = SearchVectorField(null=True, editable=False)
 
-    objects = POIQuerySet.as_manager()
+    objects = SoftDeletedManager.from_queryset(POIQuerySet)()
+    all_objects = POIQuerySet.as_manager()
+
+    # Deletion fields are tracked too, since region membership is only kept for the live POIs.
+    tracked_fields = ('location', 'deleted', 'deleted_by_id')
 
     class Meta:
         permissions = (
@@ -84,3 +427,23 @@ class POI(Described):
         )
         verbose_name = _('POI')
         verbose_name_plural = _('POIs')
+        # Live searches by location hit the partial GiST indexes instead (both on the location
+        #   and on its geography cast), which are only created by migrations: the PostGIS schema
+        #   editor does not support conditions on spatial indexes.
+        indexes = [
+            models.Index(fields=['id'], name='wtfapi_poi_alive_id', condition=ALIVE),
+            GinIndex(fields=['search_vector'], name='wtfapi_poi_alive_search', condition=ALIVE),
+            GinIndex(fields=['name'], name='wtfapi_poi_alive_name_trgm', opclasses=['gin_trgm_ops'],
+                     condition=ALIVE),
+        ]
+
+    @property
+    def rating_average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    def refresh_regions(self):
+        """
+        Recomputes the country and province membership of this POI.
+        """
+
+        self.__class__.all_objects.filter(pk=self.pk).refresh_regions()
@@ -4,13 +4,14 @@ Points of interest are the stuff we search for. This means: we use some kind of
 """
 
 
-from django.db import models
-from django.contrib.gis.db.models import MultiPolygonField
+from django.db import models, connection
+from django.dispatch import Signal
+from django.contrib.gis.db.models import MultiPolygonField, GeometryField
 from django.utils.translation import ugettext_lazy as _
-from .base import SoftDeletedQueryset, Described
+from .base import ALIVE, SoftDeletedQueryset, SoftDeletedManager, Described, FieldTracked
 
 
-class Region(Described):
+class Region(Described, FieldTracked):
     """
     Regions are geographical boundaries which will come in 2 different levels:
     - Country
@@ -25,11 +26,80 @@ class Region(Described):
     # Managers.
     managers = models.ForeignKey('User', related_name='managed_%(class)s_records', blank=True, on_delete=models.PROTECT)
 
+    tracked_fields = ('boundaries',)
+
+    # Maximum number of vertices of each boundary piece (see `refresh_pieces`).
+    PIECE_MAX_VERTICES = 256
+
     class Meta:
         abstract = True
 
+    def refresh_pieces(self):
+        """
+        Cuts this region's boundaries into small pieces, replacing the former ones. Point-in-polygon
+          tests against those pieces are much cheaper than against the whole (and huge) boundaries.
+        """
+
+        pieces = self.pieces.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {pieces} WHERE region_id = %s'.format(pieces=pieces), [self.pk])
+            cursor.execute('INSERT INTO {pieces} (region_id, boundaries) '
+                           'SELECT id, ST_Subdivide(boundaries, %s) FROM {regions} WHERE id = %s'.format(
+                               pieces=pieces, regions=self._meta.db_table
+                           ), [self.PIECE_MAX_VERTICES, self.pk])
+
+    def refresh_pois(self):
+        """
+        Recomputes which (live) POIs lie in this region, replacing this region's rows in
+          the POI membership table.
+        """
+
+        through = self.pois.through._meta.db_table
+        region_column = self._meta.model_name + '_id'
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {through} WHERE {column} = %s'.format(
+                through=through, column=region_column
+            ), [self.pk])
+            cursor.execute('INSERT INTO {through} (poi_id, {column}) '
+                           'SELECT DISTINCT p.id, r.region_id FROM {pois} p JOIN {pieces} r '
+                           'ON ST_Intersects(r.boundaries, p.location) WHERE r.region_id = %s '
+                           'AND p.deleted = false AND p.deleted_by_id IS NULL'.format(
+                               through=through, column=region_column, pois=self.pois.model._meta.db_table,
+                               pieces=self.pieces.model._meta.db_table
+                           ), [self.pk])
+
+
+class RegionPiece(models.Model):
+    """
+    A small piece of a region's boundaries (see `Region.refresh_pieces`). These pieces are
+      derived data: they are never edited by hand.
+    """
+
+    boundaries = GeometryField()
+
+    class Meta:
+        abstract = True
 
-class CountryQuerySet(SoftDeletedQueryset):
+
+# Sent after regions are updated in bulk (which sends no post_save signals), e.g. when their
+#   managers are reassigned. The sender is the region model.
+regions_updated = Signal()
+
+
+class RegionQuerySet(SoftDeletedQueryset):
+    """
+    Base query set of the regions. Point-to-region lookups go through the in-memory region index
+      (see `wtfapi.geocoding`), and POI-to-region ones through the precomputed membership tables
+      (which are computed against the subdivided boundaries).
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        regions_updated.send(sender=self.model)
+        return rows
+
+
+class CountryQuerySet(RegionQuerySet):
     """
     Country query sets allow us to get the list of country-related records (e.g. POIs, regions) that can be
       managed by certain user (provided they have also the permission to manage them at admin level).
@@ -47,21 +117,34 @@ class Country(Region):
     Countries will be the top-level regions, and will have country-level managers.
     """
 
-    objects = CountryQuerySet.as_manager()
+    objects = SoftDeletedManager.from_queryset(CountryQuerySet)()
+    all_objects = CountryQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('Country')
         verbose_name_plural = _('Countries')
+        indexes = [models.Index(fields=['name'], name='wtfapi_country_alive_name', condition=ALIVE)]
 
 
-class ProvinceQuerySet(SoftDeletedQueryset):
+class CountryPiece(RegionPiece):
+    """
+    A small piece of a country's boundaries.
+    """
+
+    region = models.ForeignKey(Country, related_name='pieces', on_delete=models.CASCADE)
+
+
+class ProvinceQuerySet(RegionQuerySet):
     """
     Province query sets allow us to get the list of province-related records (e.g. POIs) that can be
       managed by certain user (provided they have also the permission to manage them at admin level).
     """
 
     def allowed_for(self, user):
-        return self.filter(models.Q(managers=user) | models.Q(country__in=Country.objects.allowed_for(user)))
+        if user.is_superuser:
+            return self
+        else:
+            return self.filter(models.Q(managers=user) | models.Q(country__in=Country.objects.allowed_for(user)))
 
 
 class Province(Region):
@@ -73,7 +156,8 @@ class Province(Region):
     """
 
     country = models.ForeignKey(Country, on_delete=models.PROTECT, related_name="provinces")
-    objects = CountryQuerySet.as_manager()
+    objects = SoftDeletedManager.from_queryset(ProvinceQuerySet)()
+    all_objects = ProvinceQuerySet.as_manager()
 
     class Meta:
         permissions = (
@@ -81,3 +165,12 @@ class Province(Region):
         )
         verbose_name = _('Province')
         verbose_name_plural = _('Provinces')
+        indexes = [models.Index(fields=['name'], name='wtfapi_province_alive_name', condition=ALIVE)]
+
+
+class ProvincePiece(RegionPiece):
+    """
+    A small piece of a province's boundaries.
+    """
+
+    region = models.ForeignKey(Province, related_name='pieces', on_delete=models.CASCADE)
@@ -0,0 +1,63 @@
+"""
+Spatial helpers for the geometry fields in this app. Our locations are stored as SRID 4326 geometries
+  but we search them with metric radii, so these helpers cast them to geography (and back) in a way
+  that matches the functional GiST indexes created in the migrations.
+"""
+
+
+from django.db.models import Lookup, Func, FloatField
+from django.contrib.gis.db.models import PointField
+
+
+GEOGRAPHY_SRID = 4326
+MERCATOR_SRID = 3857
+MERCATOR_HALF_SIZE = 20037508.342789244
+
+
+def as_geography_srid(point):
+    """
+    Ensures a point is expressed in the SRID used by geography casts.
+    :param point: The point to convert. A point without SRID is assumed to be in WGS84.
+    :return: The same point, or a transformed copy of it.
+    """
+
+    if point.srid and point.srid != GEOGRAPHY_SRID:
+        return point.transform(GEOGRAPHY_SRID, clone=True)
+    return point
+
+
+@PointField.register_lookup
+class GeographyDWithin(Lookup):
+    """
+    Filters points lying within a radius, in meters, of a reference point. The column is cast to
+      geography so PostGIS can use the `(location::geography)` GiST index for the bounding box
+      prefilter, and then refines the candidates with the exact spheroid distance.
+
+    Usage: `location__geography_dwithin=(point, meters)`.
+    """
+
+    lookup_name = 'geography_dwithin'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        point, distance = self.rhs
+        point = connection.ops.Adapter(as_geography_srid(point), geography=True)
+        return 'ST_DWithin((%s)::geography, %%s, %%s)' % lhs_sql, lhs_params + [point, float(distance)]
+
+
+class GeographyKNNDistance(Func):
+    """
+    The `<->` operator between a geography-cast geometry expression and a fixed point. Ordering by
+      this expression lets PostGIS walk the `(location::geography)` GiST index in distance order
+      (KNN), instead of computing and sorting the distance of every row. The value is the sphere
+      distance, in meters.
+    """
+
+    def __init__(self, expression, point):
+        super().__init__(expression, output_field=FloatField())
+        self.point = as_geography_srid(point)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return '(%s)::geography <-> %%s' % sql, params + [connection.ops.Adapter(self.point, geography=True)]
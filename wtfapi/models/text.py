@@ -0,0 +1,43 @@
+"""
+Text search helpers for the described records. Full text search runs against a maintained
+  `tsvector` column (kept up to date by a database trigger, see the migrations), and fuzzy name
+  matching runs on pg_trgm word similarity. Both are backed by GIN indexes.
+"""
+
+
+from django.db.models import Lookup, Func, Value, FloatField, CharField
+
+
+# Text search configuration of the maintained search vectors. Names and descriptions come in any
+#   language, so words are not stemmed (just lowercased). It must match the one used by the trigger.
+SEARCH_CONFIG = 'simple'
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(Lookup):
+    """
+    Filters texts having a word (or a run of words) similar to the given string, by the pg_trgm
+      `%>` operator (its threshold is `pg_trgm.word_similarity_threshold`). Unlike the plain
+      similarity, short queries still match long names (e.g. "piza" matches "Luigi's Pizzeria").
+      A GIN index on the column with `gin_trgm_ops` backs it.
+
+    Usage: `name__trigram_word_similar='piza'`.
+    """
+
+    lookup_name = 'trigram_word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return '%s %%%%> %s' % (lhs_sql, rhs_sql), lhs_params + rhs_params
+
+
+class TrigramWordSimilarity(Func):
+    """
+    The pg_trgm word similarity (between 0 and 1) of a string to a text expression (or field name).
+    """
+
+    function = 'WORD_SIMILARITY'
+
+    def __init__(self, string, expression):
+        super().__init__(Value(string), expression, output_field=FloatField())
@@ -0,0 +1,101 @@
+"""
+API tokens. A user may hold many of them (one per logged-in device), each one expiring after
+  AUTH_TOKEN_LIFETIME seconds. Only the SHA-256 digest of each key is stored: lookups hash the
+  presented key, and a leaked table does not leak usable tokens.
+"""
+
+
+import binascii
+import os
+from datetime import timedelta
+from hashlib import sha256
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+
+class AuthTokenQuerySet(models.QuerySet):
+    """
+    Queries and maintenance on API tokens.
+    """
+
+    def expired(self):
+        """
+        Filters the tokens already expired.
+        """
+
+        return self.filter(expires_on__lte=timezone.now())
+
+    def issue(self, user, device=''):
+        """
+        Creates a new token for a user.
+        :param user: The user to create the token for.
+        :param device: An optional name of the device (or client) using the token.
+        :return: A (token, key) tuple. The raw key is only known at this point: just its digest
+          is stored.
+        """
+
+        key = binascii.hexlify(os.urandom(20)).decode()
+        token = self.create(user=user, digest=hash_token_key(key), device=device,
+                            expires_on=timezone.now() + timedelta(seconds=settings.AUTH_TOKEN_LIFETIME))
+        return token, key
+
+    def evict_surplus(self, user, keep):
+        """
+        Deletes the oldest tokens of a user, keeping only the newest ones.
+        :param user: The user to evict tokens of.
+        :param keep: How many tokens to keep.
+        :return: The digests of the deleted tokens.
+        """
+
+        surplus = list(self.filter(user=user).order_by('-created_on', '-id').values_list('id', 'digest')[keep:])
+        if surplus:
+            self.filter(id__in=[token_id for token_id, _ in surplus]).delete()
+        return [digest for _, digest in surplus]
+
+    def purge_expired(self, batch_size=5000):
+        """
+        Deletes all the expired tokens, in batches (so each DELETE holds its locks for a short time).
+        :param batch_size: How many tokens to delete per statement.
+        :return: The number of deleted tokens.
+        """
+
+        total = 0
+        while True:
+            ids = list(self.expired().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            total += self.filter(id__in=ids).delete()[0]
+            if len(ids) < batch_size:
+                return total
+
+
+def hash_token_key(key):
+    """
+    Computes the digest a raw token key is stored (and looked up) by.
+    """
+
+    return sha256(key.encode()).hexdigest()
+
+
+class AuthToken(models.Model):
+    """
+    An API token of a user, in a given device.
+    """
+
+    # Timestamp fields. Expired tokens are purged periodically (see `purge_expired`).
+    created_on = models.DateTimeField(auto_now_add=True)
+    expires_on = models.DateTimeField(db_index=True)
+    # References and key digest.
+    user = models.ForeignKey('User', related_name='auth_tokens', on_delete=models.CASCADE)
+    digest = models.CharField(max_length=64, unique=True)
+    device = models.CharField(max_length=80, blank=True, verbose_name=_('Device'))
+    objects = AuthTokenQuerySet.as_manager()
+
+    @property
+    def is_expired(self):
+        return self.expires_on <= timezone.now()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'created_on'], name='wtfapi_authtoken_user_created')]
@@ -1,9 +1,9 @@
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.core.validators import RegexValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import UserManager, PermissionsMixin
-from django.core.mail import send_mail
-from django.db.models import Max, F
+from django.core.mail import send_mail, get_connection, EmailMultiAlternatives
+from django.db.models import Max
 from django.utils import timezone
 from django.utils.deconstruct import deconstructible
 from django.utils.translation import ugettext_lazy as _
@@ -66,12 +66,31 @@ class User(AbstractBaseUser, PermissionsMixin):
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
 
-    def email_user(self, subject, message, from_email=None, **kwargs):
+    def email_user(self, subject, message, from_email=None, dedup_key=None, **kwargs):
         """
         Send an email to this user.
+        :param dedup_key: An optional deduplication key. Once a message with that key is queued,
+          further ones with the same key are dropped for MAIL_OUTBOX_DEDUP_WINDOW seconds.
         """
 
-        send_mail(subject, message, from_email, [self.email], **kwargs)
+        if dedup_key is None:
+            send_mail(subject, message, from_email, [self.email], **kwargs)
+            return
+
+        # The same arguments send_mail takes.
+        fail_silently = kwargs.pop('fail_silently', False)
+        html_message = kwargs.pop('html_message', None)
+        connection = kwargs.pop('connection', None) or get_connection(
+            username=kwargs.pop('auth_user', None), password=kwargs.pop('auth_password', None),
+            fail_silently=fail_silently
+        )
+        if kwargs:
+            raise TypeError('Unexpected arguments: %s' % ', '.join(sorted(kwargs)))
+        email = EmailMultiAlternatives(subject, message, from_email, [self.email], connection=connection)
+        if html_message:
+            email.attach_alternative(html_message, 'text/html')
+        email.dedup_key = dedup_key
+        email.send()
 
     def rate(self, poi, score):
         """
@@ -81,10 +100,15 @@ class User(AbstractBaseUser, PermissionsMixin):
         """
 
         score = max(0, min(10, score))
-        rating, created = self.ratings.get_or_create(poi=poi, defaults={'score': score})
-        if not created:
-            rating.score = score
-            rating.save()
+        with transaction.atomic():
+            self._lock()
+            rating, created = self.ratings.select_for_update().get_or_create(poi=poi, defaults={'score': score})
+            if created:
+                type(poi).all_objects.filter(pk=poi.pk).update_ratings(1, score)
+            elif rating.score != score:
+                type(poi).all_objects.filter(pk=poi.pk).update_ratings(0, score - rating.score)
+                rating.score = score
+                rating.save()
 
     def unrate(self, poi):
         """
@@ -93,12 +117,132 @@ class User(AbstractBaseUser, PermissionsMixin):
         :return: True if the rating was deleted. False if no rating existed.
         """
 
-        try:
-            rating = self.ratings.get(poi=poi)
+        with transaction.atomic():
+            self._lock()
+            try:
+                rating = self.ratings.select_for_update().get(poi=poi)
+            except Rating.DoesNotExist:
+                return False
             rating.delete()
+            type(poi).all_objects.filter(pk=poi.pk).update_ratings(-1, -rating.score)
             return True
-        except Rating.DoesNotExist:
-            return False
+
+    def rate_many(self, scores):
+        """
+        Applies many rating changes at once, in a single transaction and with bulk queries.
+        :param scores: A list of (POI id, score) pairs, in the order they were issued. A None
+          score removes the rating.
+        :return: A list with one result per pair: 'created', 'updated', 'unchanged', 'removed',
+          'missing' (there was no rating to remove) or 'not_found' (there is no such POI).
+        """
+
+        poi_model = Rating._meta.get_field('poi').related_model
+        poi_ids = {poi_id for poi_id, _ in scores}
+        with transaction.atomic():
+            self._lock()
+            found = set(poi_model.objects.filter(id__in=poi_ids).values_list('id', flat=True))
+            # The involved ratings are locked (in POI order, so concurrent batches do not deadlock),
+            # as `rate` and `unrate` do, so the deltas are never computed from stale scores.
+            existing = {rating.poi_id: rating
+                        for rating in self.ratings.filter(poi_id__in=found).select_for_update().order_by('poi_id')}
+            current = {poi_id: rating.score for poi_id, rating in existing.items()}
+
+            results = []
+            for poi_id, score in scores:
+                if poi_id not in found:
+                    results.append('not_found')
+                elif score is None:
+                    results.append('removed' if current.pop(poi_id, None) is not None else 'missing')
+                else:
+                    score = max(0, min(10, score))
+                    previous = current.get(poi_id)
+                    results.append('created' if previous is None else 'updated' if previous != score else 'unchanged')
+                    current[poi_id] = score
+
+            now = timezone.now()
+            created, updated, deltas = [], [], {}
+            for poi_id, score in current.items():
+                rating = existing.get(poi_id)
+                if rating is None:
+                    created.append(Rating(user=self, poi_id=poi_id, score=score))
+                    deltas[poi_id] = (1, score)
+                elif rating.score != score:
+                    deltas[poi_id] = (0, score - rating.score)
+                    rating.score, rating.updated_on = score, now
+                    updated.append(rating)
+            removed = [poi_id for poi_id in existing if poi_id not in current]
+            for poi_id in removed:
+                deltas[poi_id] = (-1, -existing[poi_id].score)
+
+            Rating.objects.bulk_create(created)
+            Rating.objects.bulk_update(updated, ['score', 'updated_on'])
+            self.ratings.filter(poi_id__in=removed).delete()
+            poi_model.all_objects.apply_rating_deltas(deltas)
+            return results
+
+    def bookmark_many(self, changes):
+        """
+        Applies many bookmark changes at once, in a single transaction and with bulk queries.
+        :param changes: A list of (POI id, bookmarked) pairs, in the order they were issued.
+          New bookmarks are added at the end, in that order.
+        :return: A list with one result per pair: 'created', 'existing', 'removed', 'missing'
+          (there was no bookmark to remove) or 'not_found' (there is no such POI).
+        """
+
+        poi_model = Bookmark._meta.get_field('poi').related_model
+        poi_ids = {poi_id for poi_id, _ in changes}
+        with transaction.atomic():
+            self._lock()
+            found = set(poi_model.objects.filter(id__in=poi_ids).values_list('id', flat=True))
+            existing = set(self.bookmarks.filter(poi_id__in=found).values_list('poi_id', flat=True))
+            # Insertion-ordered set of the currently bookmarked POIs (among the involved ones).
+            current = dict.fromkeys(existing)
+
+            results = []
+            for poi_id, bookmarked in changes:
+                if poi_id not in found:
+                    results.append('not_found')
+                elif bookmarked:
+                    results.append('existing' if poi_id in current else 'created')
+                    current.setdefault(poi_id)
+                else:
+                    results.append('removed' if poi_id in current else 'missing')
+                    current.pop(poi_id, None)
+
+            self.bookmarks.filter(poi_id__in=existing.difference(current)).delete()
+            order = self._last_bookmark_order()
+            created = []
+            for poi_id in current:
+                if poi_id not in existing:
+                    order += Bookmark.ORDER_GAP
+                    created.append(Bookmark(user=self, poi_id=poi_id, order=order))
+            Bookmark.objects.bulk_create(created)
+            return results
+
+    def _lock(self):
+        """
+        Locks this user's row until the end of the current transaction. Used to serialize
+          the changes to this user's bookmarks and ratings (e.g. a rating being created by `rate`
+          while a `rate_many` batch creates it too).
+        """
+
+        self.__class__.objects.select_for_update().values_list('pk').get(pk=self.pk)
+
+    def _last_bookmark_order(self):
+        return self.bookmarks.aggregate(max=Max('order'))['max'] or 0
+
+    def _rebalance_bookmarks(self, first=()):
+        """
+        Renumbers this user's bookmarks, spreading their order keys evenly again.
+        :param first: Ids of bookmarks to put first, in this order. The rest keep their order.
+        """
+
+        bookmarks = list(self.bookmarks.order_by('order', 'id').only('id', 'order'))
+        positions = {bookmark_id: index for index, bookmark_id in enumerate(first)}
+        bookmarks.sort(key=lambda bookmark: positions.get(bookmark.id, len(positions)))
+        for index, bookmark in enumerate(bookmarks):
+            bookmark.order = (index + 1) * Bookmark.ORDER_GAP
+        Bookmark.objects.bulk_update(bookmarks, ['order'])
 
     def bookmark(self, poi):
         """
@@ -107,70 +251,71 @@ class User(AbstractBaseUser, PermissionsMixin):
         :return: The new or existing bookmark, and whether it was just created.
         """
 
-        try:
-            return self.bookmarks.get(poi=poi), False
-        except Bookmark.DoesNotExist:
-            order = 1 + (self.bookmarks.aggregate(max=Max('order'))['max'] or 0)
-            return self.bookmarks.create(poi=poi, order=order), True
+        with transaction.atomic():
+            self._lock()
+            try:
+                return self.bookmarks.get(poi=poi), False
+            except Bookmark.DoesNotExist:
+                order = self._last_bookmark_order() + Bookmark.ORDER_GAP
+                return self.bookmarks.create(poi=poi, order=order), True
 
     def unbookmark(self, poi):
         """
-        Removes the POI from bookmark (and fills the order gap).
+        Removes the POI from bookmark. The order keys are sparse, so the gap is left as is.
         :param poi: The POI to remove from bookmarks.
         :return: Whether the POI was just removed.
         """
 
-        try:
-            bookmark = self.bookmarks.get(poi=poi)
-            order = bookmark.order
-            bookmark.delete()
-            self.bookmarks.filter(order_gt=order).update(order=F('order') - 1)
-            return True
-        except Bookmark.DoesNotExist:
-            return False
+        return self.bookmarks.filter(poi=poi).delete()[0] > 0
 
     def bookmark_move(self, bookmark, before=None):
         """
         Inserts a bookmark BEFORE another bookmark, or
           at the end of the user's bookmarks list.
 
+        Only the moved bookmark is updated: it takes an order key between the ones of
+          `before` and the bookmark preceding it. When there is no room left between
+          them, the user's bookmarks are rebalanced first.
+
         Both bookmarks must belong to the current user.
         :param bookmark: The bookmark to insert, which must exist a priori.
         :param before: The reference bookmark to insert the new bookmark
           before, or None to move the bookmark to the end of the list.
-        :return:
+        :return: Whether the bookmark was moved.
         """
 
-        def _popout(bookmark_to_pop):
-            order = bookmark_to_pop.order
-            bookmark_to_pop.order = 0
-            bookmark_to_pop.save()
-            self.bookmarks.filter(order_gt=order).update(order=F('order') - 1)
-
-        def _pushback(bookmark_to_push):
-            bookmark_to_push.order = 1 + (self.bookmarks.aggregate(max=Max('order'))['max'] or 0)
-            bookmark_to_push.save()
-
-        if bookmark.user != self:
-            return False
-        elif before is None:
-            _popout(bookmark)
-            _pushback(bookmark)
-            return True
-        elif before.user != self:
+        if bookmark.user_id != self.pk or (before is not None and before.user_id != self.pk):
             return False
-        else:
-            _popout(bookmark)
-            # Yes: Intentionally reload the `before` bookmark.
-            before = self.bookmarks.get(id=before.id)
-            # Now `bookmark.order` must be the same as `before.order`...
-            bookmark.order = before.order
-            # ...but before saving we must push elements in that/+ order, one step further.
-            self.bookmarks.filter(order_gte=bookmark.order).update(order=F('order') + 1)
-            # Now, save the bookmark.
-            bookmark.save()
+
+        with transaction.atomic():
+            self._lock()
+            if before is None:
+                bookmark.order = self._last_bookmark_order() + Bookmark.ORDER_GAP
+            else:
+                for attempt in range(2):
+                    # Yes: Intentionally reload the `before` bookmark.
+                    before = self.bookmarks.get(id=before.id)
+                    previous = self.bookmarks.filter(order__lt=before.order).exclude(id=bookmark.id)\
+                                             .aggregate(max=Max('order'))['max'] or 0
+                    if before.order - previous > 1:
+                        break
+                    self._rebalance_bookmarks()
+                bookmark.order = (previous + before.order) // 2
+            bookmark.save(update_fields=('order', 'updated_on'))
             return True
 
+    def bookmark_reorder(self, pois):
+        """
+        Applies a whole reordering of this user's bookmarks at once.
+        :param pois: The ids of the bookmarked POIs, in their new order. Bookmarks not
+          listed here are kept after the listed ones, in their current order.
+        """
+
+        with transaction.atomic():
+            self._lock()
+            ids = dict(self.bookmarks.filter(poi_id__in=pois).values_list('poi_id', 'id'))
+            self._rebalance_bookmarks([ids[poi] for poi in pois if poi in ids])
+
 
 class Bookmark(models.Model):
     """
@@ -181,13 +326,16 @@ class Bookmark(models.Model):
     # Timestamp fields.
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
-    # References and order.
+    # References and order. Order keys are sparse (see `User.bookmark_move`).
     user = models.ForeignKey(User, related_name='bookmarks', on_delete=models.PROTECT)
     poi = models.ForeignKey('POI', related_name='bookmarks', on_delete=models.CASCADE)
-    order = models.PositiveIntegerField()
+    order = models.BigIntegerField()
+
+    ORDER_GAP = 1 << 16
 
     class Meta:
-        unique_together = (('user', 'poi'), ('user', 'order'))
+        unique_together = (('user', 'poi'),)
+        indexes = [models.Index(fields=['user', 'order'], name='wtfapi_bookmark_user_order')]
 
 
 class Rating(models.Model):
@@ -0,0 +1,75 @@
+"""
+Signal handlers keeping derived data (e.g. region membership, or cached tokens) in sync with the records they come from.
+"""
+
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from category.models import Category
+from .api.authentication import invalidate_token
+from .categories import category_tree
+from .geocoding import region_index
+from .tiles import invalidate_point
+from .models import POI, Country, Province, User, AuthToken
+from .models.regions import regions_updated
+
+
+@receiver(post_save, sender=POI)
+def refresh_poi_regions(sender, instance, created, raw, **kwargs):
+    if not raw and any(instance.has_changed(name) for name in ('location', 'deleted', 'deleted_by_id')):
+        instance.refresh_regions()
+
+
+@receiver(post_save, sender=POI)
+@receiver(post_delete, sender=POI)
+def invalidate_poi_tiles(sender, instance, **kwargs):
+    points = [point for point in (instance.location, instance.loaded_value('location')) if point is not None]
+
+    def _invalidate():
+        for point in points:
+            invalidate_point(point)
+
+    transaction.on_commit(_invalidate)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=Province)
+def refresh_region_pois(sender, instance, created, raw, **kwargs):
+    if not raw and instance.has_changed('boundaries'):
+        instance.refresh_pieces()
+        instance.refresh_pois()
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=Province)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=Province)
+@receiver(regions_updated, sender=Country)
+@receiver(regions_updated, sender=Province)
+def invalidate_region_index(sender, instance=None, **kwargs):
+    transaction.on_commit(region_index.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, instance, **kwargs):
+    transaction.on_commit(category_tree.invalidate)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_auth_tokens(sender, instance, created, raw, **kwargs):
+    # Cached tokens hold a copy of their user (e.g. whether it is active), which is now stale.
+    if not raw and not created:
+        digests = list(instance.auth_tokens.values_list('digest', flat=True))
+
+        def _invalidate():
+            for digest in digests:
+                invalidate_token(digest)
+
+        transaction.on_commit(_invalidate)
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_auth_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_token(instance.digest))
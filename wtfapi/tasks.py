@@ -0,0 +1,32 @@
+from celery import shared_task
+from django.conf import settings
+from .archival import archive_deleted
+from .mail import flush_outbox
+from .models import AuthToken
+
+
+@shared_task(ignore_result=True)
+def purge_expired_auth_tokens():
+    """
+    Deletes the expired API tokens, so the tokens table (and its indexes) stay small.
+    """
+
+    AuthToken.objects.purge_expired(settings.AUTH_TOKEN_PURGE_BATCH_SIZE)
+
+
+@shared_task(ignore_result=True)
+def flush_mail_outbox():
+    """
+    Sends the queued e-mail messages.
+    """
+
+    flush_outbox()
+
+
+@shared_task(ignore_result=True)
+def archive_deleted_records():
+    """
+    Moves the soft-deleted records, past their retention, into the archive.
+    """
+
+    archive_deleted()
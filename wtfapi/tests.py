@@ -1,3 +1,847 @@
-from django.test import TestCase
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+from django.conf import settings
+from django.contrib.admin.sites import site as admin_site
+from django.contrib.gis.geos import Point, Polygon, MultiPolygon
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from category.models import Category
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .admin import POIAdmin, RegionAdmin, EstimatedCountPaginator, get_allowed_regions
+from .api.authentication import CachedTokenAuthentication, issue_token, _local_entries
+from .api.cursors import encode_cursor, CursorField
+from .api.throttling import MemoryThrottleStore, IPThrottle, UsernameThrottle
+from .archival import archive_deleted
+from .categories import CategoryTree, category_tree
+from .imports import read_geojson, POIImporter, ImportRecord
+from .mail import OutboxEmailBackend, flush_outbox
+from .management.commands.import_pois import Command as ImportPOIsCommand
+from .models import POI, User, Rating, Bookmark, OutboxMessage, AuthToken, ArchivedRecord, Country, Province
+from .models.poi import POIQuerySet
+from .models.tokens import hash_token_key
 
-# Create your tests here.
+
+class ReadGeoJSONTestCase(SimpleTestCase):
+    """
+    Incremental decoding of GeoJSON feature collections.
+    """
+
+    DOCUMENT = (
+        '{"type": "FeatureCollection", "name": "some pois", "features": [\n'
+        '  {"type": "Feature", "geometry": {"type": "Point", "coordinates": [-58.3816, -34.6037]},\n'
+        '   "properties": {"name": "Obelisco", "description": "A \\"big\\" one, with [brackets] and {braces}",\n'
+        '                  "categories": ["monuments", "landmarks"]}},\n'
+        '  {"type": "Feature", "geometry": {"type": "Point", "coordinates": [2.2945, 48.8584]},\n'
+        '   "properties": {"name": "Tour Eiffel", "description": "", "internal_notes": "tall"}}\n'
+        ']}'
+    )
+
+    def _read(self, chunk_size):
+        return list(read_geojson(StringIO(self.DOCUMENT), chunk_size))
+
+    def test_reads_all_the_features(self):
+        records = self._read(1 << 16)
+        self.assertEqual([record.name for record in records], ['Obelisco', 'Tour Eiffel'])
+        self.assertEqual((records[0].longitude, records[0].latitude), (-58.3816, -34.6037))
+        self.assertEqual(records[0].description, 'A "big" one, with [brackets] and {braces}')
+        self.assertEqual(records[0].categories, ['monuments', 'landmarks'])
+        self.assertEqual(records[1].internal_notes, 'tall')
+
+    def test_values_split_across_chunks(self):
+        # Every chunk size splits some key, string or number in two (or more) reads.
+        expected = self._read(1 << 16)
+        for chunk_size in (1, 2, 3, 7, 16, 61):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self._read(chunk_size), expected)
+
+    def test_empty_collection(self):
+        self.assertEqual(list(read_geojson(StringIO('{"type": "FeatureCollection", "features": []}'), 4)), [])
+
+    def test_truncated_stream(self):
+        with self.assertRaises(ValueError):
+            list(read_geojson(StringIO(self.DOCUMENT[:-40]), 16))
+
+
+class ImportResumeTestCase(SimpleTestCase):
+    """
+    Batching, checkpoints and resuming of POI imports. Batches are recorded instead of inserted.
+    """
+
+    RECORDS = [ImportRecord('POI %d' % index, '', 0.0, 0.0, [], '') for index in range(10)]
+
+    def _import(self, skip=0, batch_size=3):
+        batches, progress = [], []
+        with mock.patch('wtfapi.imports.Category.objects.values_list', return_value=[]):
+            importer = POIImporter(batch_size)
+        with mock.patch.object(importer, '_load_batch', side_effect=lambda batch: batches.append(list(batch))):
+            done = importer.run(iter(self.RECORDS), skip, lambda total, rate: progress.append(total))
+        return done, batches, progress
+
+    def test_batches_and_progress(self):
+        done, batches, progress = self._import()
+        self.assertEqual(done, 10)
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 3, 1])
+        self.assertEqual(progress, [3, 6, 9, 10])
+
+    def test_resume_skips_the_imported_records(self):
+        done, batches, progress = self._import(skip=6)
+        self.assertEqual(done, 10)
+        self.assertEqual([record.name for batch in batches for record in batch], ['POI 6', 'POI 7', 'POI 8', 'POI 9'])
+        self.assertEqual(progress, [9, 10])
+
+    def test_resume_after_the_end(self):
+        done, batches, progress = self._import(skip=10)
+        self.assertEqual((done, batches, progress), (10, [], []))
+
+    def test_checkpoint_round_trip(self):
+        command = ImportPOIsCommand()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pois.csv.checkpoint')
+            self.assertEqual(command._read_checkpoint(path), 0)
+            command._write_checkpoint(path, 6)
+            self.assertEqual(command._read_checkpoint(path), 6)
+            command._write_checkpoint(path, 9)
+            self.assertEqual(command._read_checkpoint(path), 9)
+            self.assertEqual(os.listdir(directory), ['pois.csv.checkpoint'])
+
+
+@override_settings(ACCOUNT_THROTTLE_RATES={'ip': (3, 60), 'username': (2, 60)})
+class SlidingWindowThrottleTestCase(SimpleTestCase):
+    """
+    Sliding-window throttling against the in-memory store, at controlled times.
+    """
+
+    def setUp(self):
+        self.store = MemoryThrottleStore()
+        self.now = 0
+        patchers = [mock.patch('wtfapi.api.throttling.get_throttle_store', return_value=self.store),
+                    mock.patch('wtfapi.api.throttling.time.time', side_effect=lambda: self.now)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _request(ip='10.0.0.1', username=None):
+        data = {} if username is None else {'username': username}
+        return Request(APIRequestFactory().post('/', data, format='json', REMOTE_ADDR=ip), parsers=[JSONParser()])
+
+    def _allowed(self, throttle_class, at, **request_kwargs):
+        self.now = at
+        throttle = throttle_class()
+        return throttle.allow_request(self._request(**request_kwargs), None), throttle.wait()
+
+    def test_store_buckets(self):
+        self.assertEqual(self.store.hit('key', 60, 10), (0, 1))
+        self.assertEqual(self.store.hit('key', 60, 59), (0, 2))
+        self.assertEqual(self.store.hit('key', 60, 60), (2, 1))
+        self.assertEqual(self.store.hit('key', 60, 185), (0, 1))
+
+    def test_limit_reached(self):
+        for _attempt in range(3):
+            self.assertEqual(self._allowed(IPThrottle, 0), (True, None))
+        allowed, wait = self._allowed(IPThrottle, 0)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 60)
+
+    def test_window_rollover(self):
+        for _attempt in range(3):
+            self.assertTrue(self._allowed(IPThrottle, 30)[0])
+        self.assertFalse(self._allowed(IPThrottle, 59)[0])
+        # Half of the previous bucket (4 hits, the rejected one included) still overlaps the window:
+        #   4 * 0.5 + 1 <= 3, but 4 * 0.5 + 2 > 3.
+        self.assertTrue(self._allowed(IPThrottle, 90)[0])
+        allowed, wait = self._allowed(IPThrottle, 90)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 30)
+        # A whole bucket later, the old hits no longer count.
+        for _attempt in range(3):
+            self.assertTrue(self._allowed(IPThrottle, 180)[0])
+
+    def test_separate_ip_keys(self):
+        for _attempt in range(3):
+            self.assertTrue(self._allowed(IPThrottle, 0, ip='10.0.0.1')[0])
+        self.assertFalse(self._allowed(IPThrottle, 0, ip='10.0.0.1')[0])
+        self.assertTrue(self._allowed(IPThrottle, 0, ip='10.0.0.2')[0])
+
+    def test_separate_username_keys(self):
+        # The same username is throttled from any IP (and regardless of its case).
+        self.assertTrue(self._allowed(UsernameThrottle, 0, ip='10.0.0.1', username='someone')[0])
+        self.assertTrue(self._allowed(UsernameThrottle, 0, ip='10.0.0.2', username='SomeOne')[0])
+        self.assertFalse(self._allowed(UsernameThrottle, 0, ip='10.0.0.3', username='someone')[0])
+        self.assertTrue(self._allowed(UsernameThrottle, 0, ip='10.0.0.1', username='another')[0])
+        # The IP counters are kept apart from the username ones.
+        self.assertTrue(self._allowed(IPThrottle, 0, ip='10.0.0.1')[0])
+
+    def test_no_username_nor_token(self):
+        for _attempt in range(5):
+            self.assertEqual(self._allowed(UsernameThrottle, 0), (True, None))
+
+
+class CursorTestCase(SimpleTestCase):
+    """
+    Signed cursors of the keyset-paginated endpoints.
+    """
+
+    def test_round_trip(self):
+        for key in [(12,), (1530.25, 12), (0.75, 3)]:
+            with self.subTest(key=key):
+                self.assertEqual(CursorField('search').run_validation(encode_cursor(key, 'search')), key)
+
+    def test_tampered_signature(self):
+        cursor = encode_cursor((1530.25, 12), 'search')
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        with self.assertRaises(ValidationError):
+            CursorField('search').run_validation(tampered)
+
+    def test_tampered_key(self):
+        cursor = encode_cursor((1530.25, 12), 'search')
+        forged = encode_cursor((0, 1), 'search').split(':')[0] + cursor[cursor.index(':'):]
+        with self.assertRaises(ValidationError):
+            CursorField('search').run_validation(forged)
+
+    def test_wrong_scope(self):
+        with self.assertRaises(ValidationError):
+            CursorField('nearby').run_validation(encode_cursor((1530.25, 12), 'search'))
+
+
+class KeysetConditionTestCase(SimpleTestCase):
+    """
+    Conditions of the rows coming after a key, in keyset pagination.
+    """
+
+    def test_single_field(self):
+        self.assertEqual(POIQuerySet.keyset_condition(('id',), (12,)), Q(id__gt=12))
+
+    def test_ascending(self):
+        self.assertEqual(POIQuerySet.keyset_condition(('distance', 'id'), (1530.25, 12)),
+                         Q(distance__gt=1530.25) | (Q(distance=1530.25) & Q(id__gt=12)))
+
+    def test_descending(self):
+        self.assertEqual(POIQuerySet.keyset_condition(('-rank', 'id'), (0.75, 3)),
+                         Q(rank__lt=0.75) | (Q(rank=0.75) & Q(id__gt=3)))
+
+    def test_mixed_directions(self):
+        self.assertEqual(POIQuerySet.keyset_condition(('-rank', 'distance', 'id'), (0.75, 1530.25, 3)),
+                         Q(rank__lt=0.75) | (Q(rank=0.75) & (Q(distance__gt=1530.25) |
+                                                             (Q(distance=1530.25) & Q(id__gt=3)))))
+
+
+class BookmarkOrderTestCase(TestCase):
+    """
+    Sparse bookmark order keys, when the gaps between them run out.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('someone', 'someone@example.com')
+        self.pois = [POI.objects.create(name='POI %d' % index, description='',
+                                        location=Point(index, index, srid=4326)) for index in range(4)]
+        # Consecutive order keys: there is no room left between any two of them.
+        self.bookmarks = [Bookmark.objects.create(user=self.user, poi=poi, order=index + 1)
+                          for index, poi in enumerate(self.pois)]
+
+    def _ordered_pois(self):
+        return list(self.user.bookmarks.order_by('order').values_list('poi_id', flat=True))
+
+    def _assert_evenly_spread(self):
+        orders = list(self.user.bookmarks.order_by('order').values_list('order', flat=True))
+        self.assertEqual(orders, [(index + 1) * Bookmark.ORDER_GAP for index in range(len(orders))])
+
+    def test_move_with_no_room_rebalances(self):
+        first, second, third, fourth = self.bookmarks
+        self.assertTrue(self.user.bookmark_move(fourth, before=second))
+        self.assertEqual(self._ordered_pois(), [self.pois[0].id, self.pois[3].id, self.pois[1].id, self.pois[2].id])
+        # The others were rebalanced, and the moved one took the middle of its gap.
+        fourth.refresh_from_db()
+        self.assertEqual(fourth.order, Bookmark.ORDER_GAP + Bookmark.ORDER_GAP // 2)
+
+    def test_move_before_the_first_with_no_room_rebalances(self):
+        first, second, third, fourth = self.bookmarks
+        self.assertTrue(self.user.bookmark_move(third, before=first))
+        self.assertEqual(self._ordered_pois(), [self.pois[2].id, self.pois[0].id, self.pois[1].id, self.pois[3].id])
+
+    def test_move_with_room_does_not_rebalance(self):
+        self.user._rebalance_bookmarks()
+        first, second, third, fourth = [Bookmark.objects.get(pk=bookmark.pk) for bookmark in self.bookmarks]
+        self.assertTrue(self.user.bookmark_move(first, before=fourth))
+        self.assertEqual(self._ordered_pois(), [self.pois[1].id, self.pois[2].id, self.pois[0].id, self.pois[3].id])
+        for bookmark in (second, third, fourth):
+            self.assertEqual(Bookmark.objects.get(pk=bookmark.pk).order, bookmark.order)
+
+    def test_repeated_moves_into_the_same_gap(self):
+        # Each move halves the gap before the second bookmark, until it runs out and gets rebalanced.
+        self.user._rebalance_bookmarks()
+        for _attempt in range(40):
+            first, second, third, fourth = sorted(Bookmark.objects.filter(user=self.user), key=lambda b: b.order)
+            self.assertTrue(self.user.bookmark_move(fourth, before=second))
+        self.assertEqual(len(set(self.user.bookmarks.values_list('order', flat=True))), 4)
+
+    def test_reorder(self):
+        self.user.bookmark_reorder([self.pois[2].id, self.pois[0].id])
+        self.assertEqual(self._ordered_pois(), [self.pois[2].id, self.pois[0].id, self.pois[1].id, self.pois[3].id])
+        self._assert_evenly_spread()
+
+    def test_move_to_the_end(self):
+        first = self.bookmarks[0]
+        self.assertTrue(self.user.bookmark_move(first))
+        self.assertEqual(self._ordered_pois(), [self.pois[1].id, self.pois[2].id, self.pois[3].id, self.pois[0].id])
+
+
+class RateManyTestCase(TestCase):
+    """
+    Batches of rating changes: the per-item results, and the rating aggregates they leave.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('someone', 'someone@example.com')
+        self.pois = [POI.objects.create(name='POI %d' % index, description='',
+                                        location=Point(index, index, srid=4326)) for index in range(4)]
+
+    def _aggregates(self, poi):
+        poi.refresh_from_db()
+        return poi.rating_count, poi.rating_sum
+
+    def test_results(self):
+        first, second, third, fourth = self.pois
+        self.user.rate(first, 5)
+        self.user.rate(second, 7)
+        results = self.user.rate_many([(first.id, 8), (second.id, 7), (third.id, 4), (fourth.id, None),
+                                       (second.id, None), (0, 3), (third.id, 12)])
+        self.assertEqual(results, ['updated', 'unchanged', 'created', 'missing', 'removed', 'not_found', 'updated'])
+        self.assertEqual(dict(self.user.ratings.values_list('poi_id', 'score')), {first.id: 8, third.id: 10})
+        self.assertEqual(self._aggregates(first), (1, 8))
+        self.assertEqual(self._aggregates(second), (0, 0))
+        self.assertEqual(self._aggregates(third), (1, 10))
+        self.assertEqual(self._aggregates(fourth), (0, 0))
+
+    def test_matches_single_ratings(self):
+        # Both paths leave the same ratings and aggregates, whatever the other users rated.
+        other = User.objects.create_user('another', 'another@example.com')
+        other.rate(self.pois[0], 3)
+        self.user.rate_many([(self.pois[0].id, 6), (self.pois[1].id, 2)])
+        self.user.rate(self.pois[1], 9)
+        self.user.unrate(self.pois[0])
+        self.assertEqual(self._aggregates(self.pois[0]), (1, 3))
+        self.assertEqual(self._aggregates(self.pois[1]), (1, 9))
+        self.assertEqual(Rating.objects.count(), 2)
+
+
+class TextSearchPagingTestCase(TestCase):
+    """
+    Keyset pages of text searches, when many POIs tie on relevance.
+    """
+
+    def setUp(self):
+        # Same name and description: every POI gets the very same rank.
+        self.pois = [POI.objects.create(name='Luigi Pizzeria', description='Pizza and pasta',
+                                        location=Point(index, index, srid=4326)) for index in range(7)]
+
+    def test_pages_over_tied_ranks(self):
+        seen, after = [], None
+        while True:
+            page = list(POI.objects.search(text='pizzeria', after=after, limit=2).values('id', 'rank'))
+            seen.extend(poi['id'] for poi in page)
+            if len(page) < 2:
+                break
+            # Keys travel through the cursors, as in the search endpoint.
+            after = CursorField('search').run_validation(encode_cursor((page[-1]['rank'], page[-1]['id']), 'search'))
+        self.assertEqual(seen, sorted(poi.id for poi in self.pois))
+
+
+@override_settings(MAIL_OUTBOX_BACKEND='django.core.mail.backends.locmem.EmailBackend', MAIL_OUTBOX_BATCH_SIZE=2,
+                   MAIL_OUTBOX_MAX_ATTEMPTS=3, MAIL_OUTBOX_DEDUP_WINDOW=900, MAIL_OUTBOX_CLAIM_TIMEOUT=300,
+                   MAIL_OUTBOX_FAILED_RETENTION=3600)
+class OutboxTestCase(TestCase):
+    """
+    Queueing, deduplication, claims and failures of the mail outbox. Messages are delivered to
+      the in-memory mailbox.
+    """
+
+    def setUp(self):
+        # No connection is kept from other tests.
+        patcher = mock.patch('wtfapi.mail._connection', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _queue(subject, dedup_key=None):
+        message = EmailMessage(subject, 'Body', 'from@example.com', ['to@example.com'])
+        if dedup_key:
+            message.dedup_key = dedup_key
+        return OutboxEmailBackend().send_messages([message])
+
+    @staticmethod
+    def _failing():
+        return mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                          side_effect=SMTPException('Service not available'))
+
+    @staticmethod
+    def _failing_for(message, pk):
+        if message.pk == pk:
+            raise SMTPException('Bad message')
+        return EmailMessage(message.subject, message.body, message.from_email, message.recipients['to'])
+
+    def test_queue_and_flush(self):
+        for index in range(3):
+            self._queue('Message %d' % index)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(flush_outbox(), 3)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['Message 0', 'Message 1', 'Message 2'])
+        self.assertFalse(OutboxMessage.objects.pending().exists())
+
+    def test_dedup(self):
+        self.assertEqual(self._queue('Reset', 'reset:1'), 1)
+        self.assertEqual(self._queue('Reset again', 'reset:1'), 0)
+        self.assertEqual(self._queue('Reset', 'reset:2'), 1)
+        flush_outbox()
+        # Sent messages still count, within the window.
+        self.assertEqual(self._queue('Reset once more', 'reset:1'), 0)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['Reset', 'Reset'])
+        # And, past the window, they do not.
+        OutboxMessage.objects.update(created_on=timezone.now() - timedelta(seconds=901))
+        self.assertEqual(self._queue('Reset once more', 'reset:1'), 1)
+
+    def test_claimed_by_another_sender(self):
+        self._queue('Claimed')
+        OutboxMessage.objects.update(claimed_on=timezone.now())
+        self.assertEqual(flush_outbox(), 0)
+        # The claim expires: the sender died meanwhile.
+        OutboxMessage.objects.update(claimed_on=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(flush_outbox(), 1)
+        self.assertEqual([message.subject for message in mail.outbox], ['Claimed'])
+
+    def test_failed_messages_wait_for_their_claim(self):
+        for index in range(4):
+            self._queue('Message %d' % index)
+        with self._failing():
+            self.assertEqual(flush_outbox(), 0)
+        # Each message was attempted once, and is not retried until its claim expires.
+        self.assertEqual(list(OutboxMessage.objects.values_list('attempts', flat=True)), [1] * 4)
+        self.assertEqual(flush_outbox(), 0)
+        OutboxMessage.objects.update(claimed_on=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(flush_outbox(), 4)
+
+    def test_failures_in_full_batches(self):
+        for index in range(4):
+            self._queue('Message %d' % index)
+        first = OutboxMessage.objects.order_by('created_on').first()
+        with mock.patch('wtfapi.models.OutboxMessage.to_email_message', autospec=True,
+                        side_effect=lambda message: self._failing_for(message, first.pk)):
+            self.assertEqual(flush_outbox(), 3)
+        first.refresh_from_db()
+        self.assertEqual((first.attempts, first.sent_on), (1, None))
+        self.assertEqual(first.last_error, 'Bad message')
+
+    def test_given_up_messages_are_purged(self):
+        self._queue('Failing')
+        for _attempt in range(3):
+            OutboxMessage.objects.update(claimed_on=None)
+            with self._failing():
+                flush_outbox()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.attempts, 3)
+        # Given up on: not even an expired claim makes it claimable again.
+        OutboxMessage.objects.update(claimed_on=None)
+        self.assertEqual(flush_outbox(), 0)
+        self.assertEqual(OutboxMessage.objects.get().attempts, 3)
+        # It is kept for a while, and then purged.
+        OutboxMessage.objects.update(created_on=timezone.now() - timedelta(seconds=3601))
+        flush_outbox()
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+@override_settings(CACHES=dict(settings.CACHES, tokens={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                        'LOCATION': 'tokens'}),
+                   TOKEN_AUTH_CACHE='tokens')
+class CachedTokenAuthenticationTestCase(TransactionTestCase):
+    """
+    Both tiers (the local one and the shared one) of the token authentication cache. Transactions
+      are committed, so the invalidations (which wait for the commit) run.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.dict('wtfapi.api.authentication._local_entries', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(caches['tokens'].clear)
+        self.user = User.objects.create_user('someone', 'someone@example.com', 'some password')
+        self.key = issue_token(self.user)
+        self.digest = hash_token_key(self.key)
+
+    def _authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.key)
+
+    def _cached(self):
+        return self.digest in _local_entries, caches['tokens'].get('token-auth:' + self.digest) is not None
+
+    def test_cached_in_both_tiers(self):
+        self.assertEqual(self._cached(), (False, False))
+        user, token = self._authenticate()
+        self.assertEqual((user.pk, token.digest), (self.user.pk, self.digest))
+        self.assertEqual(self._cached(), (True, True))
+        with self.assertNumQueries(0):
+            self._authenticate()
+
+    def test_no_password_in_the_cache(self):
+        self._authenticate()
+        cached_user, cached_token = caches['tokens'].get('token-auth:' + self.digest)
+        self.assertNotIn('password', cached_user.__dict__)
+        self.assertNotIn('password', cached_token.user.__dict__)
+        # It is still loaded on demand.
+        self.assertTrue(self._authenticate()[0].check_password('some password'))
+
+    def test_deactivating_the_user(self):
+        self._authenticate()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._cached(), (False, False))
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+    def test_deleting_the_token(self):
+        self._authenticate()
+        AuthToken.objects.get(digest=self.digest).delete()
+        self.assertEqual(self._cached(), (False, False))
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+    def test_evicted_tokens(self):
+        self._authenticate()
+        with override_settings(AUTH_TOKEN_MAX_PER_USER=1):
+            issue_token(self.user)
+        self.assertEqual(self._cached(), (False, False))
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+
+class ArchivalTestCase(TestCase):
+    """
+    Moving soft-deleted POIs (and the rows depending on them) into the archive.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('someone', 'someone@example.com')
+        self.category = Category.objects.create(title='Food', slug='food')
+        self.expired, self.recent, self.alive = [
+            POI.objects.create(name=name, description='', location=Point(index, index, srid=4326))
+            for index, name in enumerate(['Expired', 'Recent', 'Alive'])
+        ]
+        for poi in (self.expired, self.recent, self.alive):
+            poi.categories.add(self.category)
+            self.user.rate(poi, 7)
+            self.user.bookmark(poi)
+        # Bulk updates, so `updated_on` is kept as given.
+        POI.all_objects.filter(pk=self.expired.pk).update(deleted=True, updated_on=timezone.now() - timedelta(days=2))
+        POI.all_objects.filter(pk=self.recent.pk).update(deleted=True)
+
+    def _archive(self):
+        with mock.patch('wtfapi.archival.invalidate_all_tiles') as invalidate_all_tiles:
+            archived = archive_deleted(retention=24 * 3600, batch_size=1, pause=0)
+        return archived, invalidate_all_tiles.called
+
+    def test_archives_expired_pois(self):
+        archived, invalidated = self._archive()
+        self.assertEqual(archived, {'wtfapi.poi': 1, 'wtfapi.province': 0, 'wtfapi.country': 0})
+        self.assertTrue(invalidated)
+        # The expired POI, and everything depending on it, left the tables.
+        self.assertFalse(POI.all_objects.filter(pk=self.expired.pk).exists())
+        self.assertEqual(set(Rating.objects.values_list('poi_id', flat=True)), {self.recent.pk, self.alive.pk})
+        self.assertEqual(set(Bookmark.objects.values_list('poi_id', flat=True)), {self.recent.pk, self.alive.pk})
+        self.assertEqual(set(POI.categories.through.objects.values_list('poi_id', flat=True)),
+                         {self.recent.pk, self.alive.pk})
+        self.assertEqual(set(POI.all_objects.values_list('pk', flat=True)), {self.recent.pk, self.alive.pk})
+
+    def test_archived_payloads(self):
+        self._archive()
+        records = {record.model: record for record in ArchivedRecord.objects.all()}
+        self.assertEqual(set(records), {'wtfapi.poi', 'wtfapi.rating', 'wtfapi.bookmark', 'wtfapi.poi_categories'})
+        self.assertEqual(records['wtfapi.poi'].record_id, self.expired.pk)
+        self.assertEqual(records['wtfapi.poi'].data['name'], 'Expired')
+        self.assertTrue(records['wtfapi.poi'].data['deleted'])
+        self.assertEqual((records['wtfapi.rating'].data['poi_id'], records['wtfapi.rating'].data['score']),
+                         (self.expired.pk, 7))
+        self.assertEqual((records['wtfapi.bookmark'].data['poi_id'], records['wtfapi.bookmark'].data['user_id']),
+                         (self.expired.pk, self.user.pk))
+        self.assertEqual(records['wtfapi.poi_categories'].data['category_id'], self.category.pk)
+
+    def test_nothing_to_archive(self):
+        self._archive()
+        archived, invalidated = self._archive()
+        self.assertEqual(archived, {'wtfapi.poi': 0, 'wtfapi.province': 0, 'wtfapi.country': 0})
+        self.assertFalse(invalidated)
+
+
+def _square(west, south, size):
+    boundaries = MultiPolygon(Polygon.from_bbox((west, south, west + size, south + size)))
+    boundaries.srid = 4326
+    return boundaries
+
+
+class RegionMembershipTestCase(TestCase):
+    """
+    The precomputed POI/region membership, as POIs and regions change.
+    """
+
+    def setUp(self):
+        manager = User.objects.create_user('manager', 'manager@example.com')
+        self.country = Country.objects.create(name='Country', description='', boundaries=_square(0, 0, 10),
+                                              managers=manager)
+        self.province = Province.objects.create(name='Province', description='', boundaries=_square(0, 0, 5),
+                                                managers=manager, country=self.country)
+        self.poi = POI.objects.create(name='POI', description='', location=Point(2, 2, srid=4326))
+
+    def _regions(self):
+        return (POI.objects.in_region([self.country]).filter(pk=self.poi.pk).exists(),
+                POI.objects.in_region([self.province]).filter(pk=self.poi.pk).exists())
+
+    def test_new_poi(self):
+        self.assertEqual(self._regions(), (True, True))
+        self.assertEqual(list(self.poi.countries.all()), [self.country])
+
+    def test_moved_poi(self):
+        self.poi.location = Point(7, 7, srid=4326)
+        self.poi.save()
+        self.assertEqual(self._regions(), (True, False))
+        self.poi.location = Point(20, 20, srid=4326)
+        self.poi.save()
+        self.assertEqual(self._regions(), (False, False))
+
+    def test_unchanged_location_is_not_recomputed(self):
+        self.poi.name = 'Renamed'
+        with mock.patch.object(POI, 'refresh_regions') as refresh_regions:
+            self.poi.save()
+        refresh_regions.assert_not_called()
+
+    def test_region_boundaries_change(self):
+        self.province.boundaries = _square(5, 5, 5)
+        self.province.save()
+        self.assertEqual(self._regions(), (True, False))
+        self.poi.location = Point(7, 7, srid=4326)
+        self.poi.save()
+        self.assertEqual(self._regions(), (True, True))
+
+    def test_bulk_changes(self):
+        # Bulk updates send no signals: the membership is refreshed explicitly.
+        POI.all_objects.filter(pk=self.poi.pk).update(location=Point(7, 7, srid=4326))
+        self.assertEqual(self._regions(), (True, True))
+        POI.all_objects.filter(pk=self.poi.pk).refresh_regions()
+        self.assertEqual(self._regions(), (True, False))
+
+    def test_deleted_poi_loses_membership(self):
+        self.poi.deleted = True
+        self.poi.save()
+        self.assertEqual(POI.all_objects.in_region([self.country]).count(), 0)
+        self.poi.deleted = False
+        self.poi.save()
+        self.assertEqual(self._regions(), (True, True))
+
+    def test_several_regions(self):
+        other = POI.objects.create(name='Other', description='', location=Point(7, 7, srid=4326))
+        self.assertEqual(set(POI.objects.in_region([self.province, self.country]).values_list('pk', flat=True)),
+                         {self.poi.pk, other.pk})
+        self.assertEqual(list(POI.objects.in_region([self.province]).in_region([self.country])), [self.poi])
+        self.assertEqual(list(POI.objects.in_region([])), [])
+
+
+class CategoryTreeTestCase(TestCase):
+    """
+    Descendant expansion by the cached category tree, and POI filters by category.
+    """
+
+    def setUp(self):
+        # Deeper than the recursion limit.
+        self.chain = []
+        parent = None
+        for index in range(sys.getrecursionlimit() + 50):
+            parent = Category.objects.create(title='Level %d' % index, slug='level-%d' % index, parent=parent)
+            self.chain.append(parent)
+        self.sibling = Category.objects.create(title='Sibling', slug='sibling', parent=self.chain[0])
+        self.other = Category.objects.create(title='Other', slug='other')
+        # Category changes invalidate the tree on commit, which never comes in these tests.
+        category_tree.invalidate()
+        self.addCleanup(category_tree.invalidate)
+
+    def test_descendants(self):
+        chain_ids = {category.pk for category in self.chain}
+        self.assertEqual(category_tree.descendants([self.chain[0]]), chain_ids | {self.sibling.pk})
+        self.assertEqual(category_tree.descendants([self.chain[10].pk]), {category.pk for category in self.chain[10:]})
+        self.assertEqual(category_tree.descendants([self.chain[-1], self.other]), {self.chain[-1].pk, self.other.pk})
+        # Unknown categories are kept as they are.
+        self.assertEqual(category_tree.descendants([0]), {0})
+
+    def test_in_categories(self):
+        deep = POI.objects.create(name='Deep', description='', location=Point(0, 0, srid=4326))
+        deep.categories.add(self.chain[-1])
+        other = POI.objects.create(name='Other', description='', location=Point(1, 1, srid=4326))
+        other.categories.add(self.other)
+        self.assertEqual(list(POI.objects.in_categories([self.chain[0]])), [deep])
+        self.assertEqual(list(POI.objects.in_categories([self.chain[0]], include_descendants=False)), [])
+        self.assertEqual(set(POI.objects.in_categories([self.sibling, self.other, self.chain[-1]])), {deep, other})
+        self.assertEqual(list(POI.objects.in_categories([])), [])
+
+    @override_settings(CATEGORY_TREE_CHECK_INTERVAL=0)
+    def test_invalidation_reaches_other_processes(self):
+        # Another process, with its own copy of the tree.
+        other_tree = CategoryTree()
+        self.assertEqual(other_tree.descendants([self.other]), {self.other.pk})
+        child = Category.objects.create(title='Child', slug='child', parent=self.other)
+        self.assertEqual(other_tree.descendants([self.other]), {self.other.pk})
+        category_tree.invalidate()
+        self.assertEqual(other_tree.descendants([self.other]), {self.other.pk, child.pk})
+
+
+class SoftDeletedTestCase(TestCase):
+    """
+    Soft-deleted records: hidden by the default manager, and still listed in the admin.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'some password')
+        self.alive, self.deleted, self.deleted_by = [
+            POI.objects.create(name=name, description='', location=Point(0, 0, srid=4326))
+            for name in ('Alive', 'Deleted', 'Deleted by')
+        ]
+        POI.all_objects.filter(pk=self.deleted.pk).update(deleted=True)
+        POI.all_objects.filter(pk=self.deleted_by.pk).update(deleted_by=self.user)
+        self.country = Country.objects.create(name='Country', description='', boundaries=_square(0, 0, 10),
+                                              managers=self.user)
+        Country.all_objects.filter(pk=self.country.pk).update(deleted=True)
+
+    def test_hidden_by_default(self):
+        self.assertEqual(list(POI.objects.all()), [self.alive])
+        self.assertEqual(list(POI.objects.within(Point(0, 0, srid=4326), 1000)), [self.alive])
+        self.assertEqual(list(POI.objects.nearest(Point(0, 0, srid=4326), 10)), [self.alive])
+        with self.assertRaises(POI.DoesNotExist):
+            POI.objects.get(pk=self.deleted.pk)
+        self.assertFalse(Country.objects.exists())
+
+    def test_reachable_through_all_objects(self):
+        self.assertEqual(POI.all_objects.count(), 3)
+        self.assertEqual(list(POI.all_objects.dead().order_by('id')), [self.deleted, self.deleted_by])
+        self.assertEqual(list(POI.all_objects.alive()), [self.alive])
+
+    def test_listed_in_the_admin(self):
+        request = RequestFactory().get('/admin/')
+        request.user = self.user
+        self.assertEqual(set(POIAdmin(POI, admin_site).get_queryset(request)),
+                         {self.alive, self.deleted, self.deleted_by})
+        self.assertEqual(list(RegionAdmin(Country, admin_site).get_queryset(request)), [self.country])
+
+
+class AdminScopingTestCase(TestCase):
+    """
+    Admin querysets of staff users, limited to the regions they manage.
+    """
+
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', 'manager@example.com', is_staff=True)
+        self.other = User.objects.create_user('other', 'other@example.com', is_staff=True)
+        self.country_a = Country.objects.create(name='A', description='', boundaries=_square(0, 0, 10),
+                                                managers=self.manager)
+        self.country_b = Country.objects.create(name='B', description='', boundaries=_square(20, 0, 10),
+                                                managers=self.other)
+        # The manager of A manages its provinces too, and also manages a province of B.
+        self.province_a = Province.objects.create(name='A1', description='', boundaries=_square(0, 0, 5),
+                                                  managers=self.other, country=self.country_a)
+        self.province_b = Province.objects.create(name='B1', description='', boundaries=_square(20, 0, 5),
+                                                  managers=self.manager, country=self.country_b)
+        self.province_b_other = Province.objects.create(name='B2', description='', boundaries=_square(25, 5, 5),
+                                                        managers=self.other, country=self.country_b)
+        self.pois = {name: POI.objects.create(name=name, description='', location=Point(x, y, srid=4326))
+                     for name, x, y in [('A1', 1, 1), ('A', 7, 7), ('B1', 21, 1), ('B2', 27, 7), ('None', 50, 50)]}
+
+    def _request(self, user):
+        request = RequestFactory().get('/admin/')
+        request.user = user
+        return request
+
+    def _pois(self, user):
+        return {poi.name for poi in POIAdmin(POI, admin_site).get_queryset(self._request(user))}
+
+    def _regions(self, model, user):
+        return {region.name for region in RegionAdmin(model, admin_site).get_queryset(self._request(user))}
+
+    def test_pois(self):
+        self.assertEqual(self._pois(self.manager), {'A1', 'A', 'B1'})
+        self.assertEqual(self._pois(self.other), {'A1', 'B1', 'B2'})
+
+    def test_regions(self):
+        self.assertEqual(self._regions(Country, self.manager), {'A'})
+        self.assertEqual(self._regions(Province, self.manager), {'A1', 'B1'})
+        self.assertEqual(self._regions(Province, self.other), {'A1', 'B1', 'B2'})
+
+    def test_country_choices(self):
+        field = RegionAdmin(Province, admin_site).formfield_for_foreignkey(
+            Province._meta.get_field('country'), self._request(self.manager)
+        )
+        self.assertEqual(list(field.queryset), [self.country_a])
+
+    def test_superusers_see_everything(self):
+        superuser = User.objects.create_superuser('admin', 'admin@example.com', 'some password')
+        self.assertEqual(self._pois(superuser), set(self.pois))
+        self.assertEqual(self._regions(Province, superuser), {'A1', 'B1', 'B2'})
+
+    def test_resolved_once_per_request(self):
+        request = self._request(self.manager)
+        allowed = get_allowed_regions(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_allowed_regions(request), allowed)
+
+    def test_revoked_access(self):
+        self.assertEqual(self._pois(self.manager), {'A1', 'A', 'B1'})
+        Country.objects.filter(pk=self.country_a.pk).update(managers=self.other)
+        self.assertEqual(self._pois(self.manager), {'B1'})
+        self.assertEqual(self._regions(Country, self.manager), set())
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    """
+    Estimated counts of the POI changelist: table statistics when unfiltered, EXPLAIN otherwise.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'some password')
+        for index in range(3):
+            POI.objects.create(name='POI %d' % index, description='', location=Point(index, index, srid=4326))
+
+    def _changelist_queries(self, path):
+        request = RequestFactory().get(path)
+        request.user = self.user
+        with CaptureQueriesContext(connection) as context:
+            changelist = POIAdmin(POI, admin_site).get_changelist_instance(request)
+        return changelist, [query['sql'] for query in context.captured_queries]
+
+    def test_unfiltered_changelist_reads_the_statistics(self):
+        changelist, queries = self._changelist_queries('/admin/wtfapi/poi/')
+        self.assertTrue(any('reltuples' in sql for sql in queries))
+        self.assertFalse(any(sql.startswith('EXPLAIN') for sql in queries))
+        # The estimate is small, so the rows are counted.
+        self.assertEqual(changelist.result_count, 3)
+
+    def test_filtered_changelist_explains(self):
+        changelist, queries = self._changelist_queries('/admin/wtfapi/poi/?q=POI+1')
+        self.assertTrue(any(sql.startswith('EXPLAIN') for sql in queries))
+        self.assertFalse(any('reltuples' in sql for sql in queries))
+        self.assertEqual(changelist.result_count, 1)
+
+    @override_settings(ADMIN_EXACT_COUNT_THRESHOLD=0)
+    def test_estimates(self):
+        # Tables never analyzed have no estimate, which must not make a negative count.
+        self.assertGreaterEqual(EstimatedCountPaginator(POI.all_objects.all(), 10).count, 0)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE wtfapi_poi')
+        self.assertEqual(EstimatedCountPaginator(POI.all_objects.all(), 10).count, 3)
+        self.assertGreaterEqual(EstimatedCountPaginator(POI.all_objects.filter(name='POI 1'), 10).count, 1)
@@ -0,0 +1,171 @@
+"""
+Mapbox Vector Tiles of POIs, rendered by PostGIS (ST_AsMVT) in the usual web mercator tiling scheme.
+
+On low zoom levels the POIs are clustered in a grid, and each tile feature is a cluster holding the
+  count of POIs in it. Rendered tiles are kept in a dedicated cache (see the POI_TILES_* settings)
+  and invalidated when a POI in (or near) them is saved or deleted. Bulk writes (which send no
+  per-POI signals) invalidate every tile at once instead, by bumping the generation number the
+  cache keys include.
+"""
+
+
+from math import pi, atan, exp, degrees, radians, floor, tan, asinh
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Func, Value, F
+from .models import POI
+from .models.poi import cluster_cell_size
+from .models.spatial import as_geography_srid, MERCATOR_SRID, MERCATOR_HALF_SIZE
+
+
+# Tile resolution, and buffer around the tile (both in tile units).
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+
+
+class AsMVTGeom(Func):
+    """
+    Transforms a web mercator geometry into the coordinate space of a tile.
+    """
+
+    function = 'ST_AsMVTGeom'
+
+    def __init__(self, expression, bounds):
+        super().__init__(expression, Value(bounds, output_field=GeometryField(srid=MERCATOR_SRID)),
+                         Value(TILE_EXTENT), Value(TILE_BUFFER), Value(True),
+                         output_field=GeometryField(srid=MERCATOR_SRID))
+
+
+def tile_size(z):
+    """
+    The size, in mercator meters, of the side of any tile in a zoom level.
+    """
+
+    return 2 * MERCATOR_HALF_SIZE / (1 << z)
+
+
+# Buffer of the clustered tiles, in tile units: a whole grid cell. So the clusters reaching the
+#   tile buffer are complete ones (and not just their POIs lying in the buffer).
+CLUSTER_BUFFER = round(cluster_cell_size(0) / tile_size(0) * TILE_EXTENT)
+
+
+def tile_bounds(z, x, y, buffer=0):
+    """
+    The (xmin, ymin, xmax, ymax) bounds of a tile, in mercator meters.
+    :param buffer: An optional buffer to add around the tile, in tile units.
+    """
+
+    size = tile_size(z)
+    margin = size * buffer / TILE_EXTENT
+    xmin = -MERCATOR_HALF_SIZE + x * size
+    ymax = MERCATOR_HALF_SIZE - y * size
+    return (max(-MERCATOR_HALF_SIZE, xmin - margin), max(-MERCATOR_HALF_SIZE, ymax - size - margin),
+            min(MERCATOR_HALF_SIZE, xmin + size + margin), min(MERCATOR_HALF_SIZE, ymax + margin))
+
+
+def mercator_to_lonlat(mx, my):
+    return mx / MERCATOR_HALF_SIZE * 180, degrees(2 * atan(exp(my / MERCATOR_HALF_SIZE * pi)) - pi / 2)
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def _tile_queryset(z, x, y):
+    bounds = Polygon.from_bbox(tile_bounds(z, x, y))
+    bounds.srid = MERCATOR_SRID
+    clustered = z <= settings.POI_TILES_CLUSTER_MAX_ZOOM
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y, CLUSTER_BUFFER if clustered else TILE_BUFFER)
+    lonlat_bbox = mercator_to_lonlat(xmin, ymin) + mercator_to_lonlat(xmax, ymax)
+    if clustered:
+        return POI.objects.clusters(lonlat_bbox, z, srid=MERCATOR_SRID).annotate(
+            geom=AsMVTGeom(F('centroid'), bounds)
+        ).values('count', 'geom')
+    lonlat_bbox = Polygon.from_bbox(lonlat_bbox)
+    lonlat_bbox.srid = 4326
+    return POI.objects.filter(location__bboverlaps=lonlat_bbox).annotate(
+        geom=AsMVTGeom(Transform('location', MERCATOR_SRID), bounds)
+    ).values('id', 'name', 'geom')
+
+
+def render_poi_tile(z, x, y):
+    """
+    Renders a POI tile.
+    :return: The tile contents, as MVT bytes.
+    """
+
+    sql, params = _tile_queryset(z, x, y).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ST_AsMVT(tile, %s, %s, %s) FROM ({}) AS tile'.format(sql),
+                       ['pois', TILE_EXTENT, 'geom'] + list(params))
+        tile = cursor.fetchone()[0]
+    return bytes(tile) if tile else b''
+
+
+def _cache():
+    return caches[settings.POI_TILES_CACHE]
+
+
+GENERATION_KEY = 'poi-tile:generation'
+
+
+def _generation():
+    return _cache().get_or_set(GENERATION_KEY, 0, None)
+
+
+def _cache_key(z, x, y, generation):
+    return 'poi-tile:%d:%d:%d:%d' % (generation, z, x, y)
+
+
+def get_poi_tile(z, x, y):
+    """
+    Gets a POI tile, from the cache or freshly rendered.
+    :return: The tile contents, as MVT bytes.
+    """
+
+    key = _cache_key(z, x, y, _generation())
+    tile = _cache().get(key)
+    if tile is None:
+        tile = render_poi_tile(z, x, y)
+        _cache().set(key, tile, settings.POI_TILES_CACHE_TIMEOUT)
+    return tile
+
+
+def invalidate_point(point):
+    """
+    Drops, on every zoom level, the cached tiles (including their buffers) covering a point. On
+      the clustered levels, those are the tiles reaching any point of its grid cell, since the
+      centroid of the cluster may lie anywhere in it.
+    :param point: The point that changed.
+    """
+
+    point = as_geography_srid(point)
+    latitude = max(-85.0511, min(85.0511, point.y))
+    fx = (point.x + 180) / 360
+    fy = (1 - asinh(tan(radians(latitude))) / pi) / 2
+    generation = _generation()
+    keys = []
+    for z in range(MAX_ZOOM + 1):
+        n = 1 << z
+        margin = (CLUSTER_BUFFER if z <= settings.POI_TILES_CLUSTER_MAX_ZOOM else TILE_BUFFER) / TILE_EXTENT
+        for x in range(max(0, floor(fx * n - margin)), min(n - 1, floor(fx * n + margin)) + 1):
+            for y in range(max(0, floor(fy * n - margin)), min(n - 1, floor(fy * n + margin)) + 1):
+                keys.append(_cache_key(z, x, y, generation))
+    _cache().delete_many(keys)
+
+
+def invalidate_all():
+    """
+    Drops all the cached tiles, by moving to a new generation of cache keys (the former ones
+      just expire). Meant for bulk writes, e.g. imports.
+    """
+
+    try:
+        _cache().incr(GENERATION_KEY)
+    except ValueError:
+        _cache().set(GENERATION_KEY, 1, None)